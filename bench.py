@@ -0,0 +1,512 @@
+"""
+Бенчмарки планировщика.
+Запуск: python bench.py - обзорные бенчмарки с выводом в консоль;
+python bench.py suite [параметры] - воспроизводимый набор замеров
+с машиночитаемым результатом (python bench.py suite -h).
+"""
+import argparse
+import csv
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import main
+
+
+def timeit(func, repeat=5):
+    """
+    Лучшее время (в секундах) из repeat запусков func().
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def random_schedule(index, rng):
+    """
+    Расписание, где каждому рейсу назначены случайные водитель и автобус.
+    """
+    return [(i, rng.choice('AB'), rng.randint(1, 30), rng.randint(1, 12)) for i in range(len(index))]
+
+def check_bus_constraints_per_minute(schedule, index):
+    """
+    Прежняя реализация check_bus_constraints (для сравнения):
+    +1 в каждую минуту каждого рейса, все дни сложены на одну ось минут.
+    """
+    usage = [0]*(main.TOTAL_TIME+1)
+    for (i, dt, did, b) in schedule:
+        if b is None or dt is None or did is None:
+            continue
+        start_i = index.starts[i] - main.START_TIME
+        end_i   = index.ends[i]   - main.START_TIME
+        for m in range(start_i, end_i):
+            if 0 <= m < main.TOTAL_TIME:
+                usage[m] += 1
+    penalties = 0
+    for x in usage:
+        if x > main.BASE_BUSES:
+            penalties += (x - main.BASE_BUSES)*main.PENALTY_BUS_CONFLICT
+    return penalties
+
+def bench_bus_constraints():
+    """
+    check_bus_constraints: поминутный массив против заметающей прямой по дням.
+    """
+    print("check_bus_constraints (лучшее из 5, мс):")
+    for days in (7, 30, 90):
+        rng = random.Random(days)
+        random.seed(days)
+        index = main.TripIndex(main.generate_possible_trips(days))
+        schedule = random_schedule(index, rng)
+        t_old = timeit(lambda: check_bus_constraints_per_minute(schedule, index))
+        t_new = timeit(lambda: main.check_bus_constraints(schedule, index=index))
+        t_aware = timeit(lambda: main.check_bus_constraints(schedule, bus_aware=True, index=index))
+        print(f"  {days:3d} дн., {len(index):5d} рейсов: поминутно {t_old*1000:8.2f}, "
+              f"по дням {t_new*1000:7.2f} (x{t_old/t_new:.1f}), "
+              f"с учётом номеров {t_aware*1000:7.2f}")
+
+def bench_parallel_scaling(pop_size=1000):
+    """
+    Масштабирование fitness_parallel по числу процессов (1 - fitness_batch).
+    """
+    random.seed(0)
+    population = [main.init_individual() for _ in range(pop_size)]
+    expected = main.fitness_batch(population)
+    t_serial = timeit(lambda: main.fitness_batch(population), repeat=3)
+    print(f"Оценка популяции из {pop_size} (лучшее из 3, мс):")
+    print(f"  1 проц.: {t_serial*1000:8.1f}")
+    for workers in (2, 4, 8):
+        pool = main.make_pool(workers)
+        try:
+            assert main.fitness_parallel(population, pool, workers) == expected
+            t = timeit(lambda: main.fitness_parallel(population, pool, workers), repeat=3)
+        finally:
+            pool.shutdown()
+        print(f"  {workers} проц.: {t*1000:8.1f} (x{t_serial/t:.2f})")
+
+def measure_allocations(build):
+    """
+    Пиковая память (байт) и число живых блоков памяти, выделенных build().
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    peak = tracemalloc.get_traced_memory()[1]
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del result
+    return peak, blocks
+
+def bench_chromosome_memory():
+    """
+    Память популяции: список кортежей (trip_id, dt, did, b) против Chromosome.
+    """
+    random.seed(0)
+    base = [main.init_individual() for _ in range(100)]
+    print(f"Память популяции ({len(main.POSSIBLE_TRIPS)} рейсов на индивидуума):")
+    for pop_size in (1000, 5000, 10000):
+        genes_mem, genes_obj = measure_allocations(
+            lambda: [base[k % 100].to_genes() for k in range(pop_size)])
+        chrom_mem, chrom_obj = measure_allocations(
+            lambda: [base[k % 100].copy() for k in range(pop_size)])
+        print(f"  {pop_size:6d}: кортежи {genes_mem/2**20:7.1f} МБ / {genes_obj:8d} блоков, "
+              f"Chromosome {chrom_mem/2**20:6.1f} МБ / {chrom_obj:6d} блоков "
+              f"(x{genes_mem/chrom_mem:.1f} по памяти)")
+
+def run_trajectory(**kwargs):
+    """
+    Запуск ГА с записью траектории (секунды с начала, best_so_far) по поколениям.
+    """
+    t0 = time.perf_counter()
+    trajectory = []
+    stats = None
+    for stats in main.iter_genetic_algorithm(**kwargs):
+        trajectory.append((time.perf_counter() - t0, stats['best_so_far']))
+    return trajectory, stats
+
+def time_to_quality(trajectory, target):
+    """
+    Время, за которое траектория впервые достигает фитнеса target (None - не достигла).
+    """
+    for t, best in trajectory:
+        if best >= target:
+            return t
+    return None
+
+def bench_early_stopping(generations=300, seed=0):
+    """
+    Время до качества: фиксированный бюджет поколений против остановки
+    по стагнации с адаптивными вероятностями операторов.
+    """
+    saved = main.GENERATIONS
+    main.GENERATIONS = generations
+    try:
+        random.seed(seed)
+        fixed, fixed_stats = run_trajectory()
+        random.seed(seed)
+        early, early_stats = run_trajectory(stall_generations=25, min_improvement=1e-4,
+                                            adaptive=True)
+    finally:
+        main.GENERATIONS = saved
+    target = early_stats['best_so_far']
+    reached = time_to_quality(fixed, target)
+    print(f"Время до качества (POP_SIZE={main.POP_SIZE}, бюджет {generations} поколений):")
+    print(f"  фиксированный бюджет: {fixed[-1][0]:6.2f} с, фитнес {fixed_stats['best_so_far']:.4f}")
+    print(f"  ранняя остановка:     {early[-1][0]:6.2f} с, фитнес {target:.4f}, "
+          f"поколений {len(early)}, причина: {early_stats['stop_reason']}")
+    if reached is None:
+        print(f"  фиксированный бюджет не достиг фитнеса {target:.4f}")
+    else:
+        print(f"  фиксированный бюджет достиг фитнеса {target:.4f} за {reached:6.2f} с")
+
+def bench_seeding(target=0.9, generations=200, seed=0):
+    """
+    Поколений и секунд до целевого фитнеса: случайная начальная популяция
+    против затравки из greedy_algorithm.
+    """
+    saved = main.GENERATIONS
+    main.GENERATIONS = generations
+    print(f"Время до фитнеса {target} (бюджет {generations} поколений):")
+    t0 = time.perf_counter()
+    greedy_fit = main.fitness(main.greedy_algorithm())
+    print(f"  greedy_algorithm: фитнес {greedy_fit:.4f} за {(time.perf_counter()-t0)*1000:.2f} мс")
+    try:
+        for seed_fraction in (0.0, 0.1, 0.5):
+            random.seed(seed)
+            t0 = time.perf_counter()
+            reached = None
+            for stats in main.iter_genetic_algorithm(seed_fraction=seed_fraction):
+                if stats['best_so_far'] >= target:
+                    reached = stats['generation'] + 1
+                    break
+            elapsed = time.perf_counter() - t0
+            result = f"достигнут за {reached} пок." if reached is not None else "не достигнут"
+            print(f"  seed_fraction={seed_fraction}: {result}, {elapsed:6.2f} с")
+    finally:
+        main.GENERATIONS = saved
+
+def bench_driver_constraints(days=90):
+    """
+    check_driver_constraints при росте пула водителей: время на рейс не должно расти.
+    """
+    index = main.TripIndex(main.generate_possible_trips(days))
+    print(f"check_driver_constraints, {len(index)} рейсов (лучшее из 5, мс):")
+    for max_driver_id in (30, 300, 3000):
+        rng = random.Random(max_driver_id)
+        schedule = [(i, rng.choice('AB'), rng.randint(1, max_driver_id), 1) for i in range(len(index))]
+        t = timeit(lambda: main.check_driver_constraints(schedule, index))
+        print(f"  {max_driver_id:5d} водителей: {t*1000:7.2f}")
+
+def bench_islands(generations=100, islands=4, seed=0):
+    """
+    Модель островов против одной популяции: время и фитнес при одинаковом
+    числе поколений (острова выполняют в islands раз больше оценок).
+    """
+    saved = main.GENERATIONS
+    main.GENERATIONS = generations
+    try:
+        random.seed(seed)
+        t0 = time.perf_counter()
+        _, single_fit = main.genetic_algorithm()
+        t_single = time.perf_counter() - t0
+    finally:
+        main.GENERATIONS = saved
+    print(f"Модель островов ({generations} поколений, POP_SIZE={main.POP_SIZE}):")
+    print(f"  одна популяция: фитнес {single_fit:.4f}, {t_single:6.2f} с")
+    for processes in (1, islands):
+        t0 = time.perf_counter()
+        _, best_fit, stats = main.island_genetic_algorithm(
+            islands=islands, processes=processes, seed=seed, generations=generations)
+        elapsed = time.perf_counter() - t0
+        per_island = ", ".join(f"{st['best']:.4f}" for st in stats)
+        print(f"  {islands} острова, {processes} проц.: фитнес {best_fit:.4f} ({per_island}), "
+              f"{elapsed:6.2f} с")
+
+def bench_trip_generation(days=30):
+    """
+    generate_trip_table + TripIndex при росте числа маршрутов.
+    """
+    print(f"Генерация рейсов на {days} дн. (лучшее из 3, мс):")
+    for n_routes in (1, 10, 40):
+        routes = [{'id': r, 'depot': 1 + r % 4, 'duration': (40, 80),
+                   'headway': 12, 'peak_headway': 6} for r in range(1, n_routes + 1)]
+        table = main.generate_trip_table(routes, days, seed=0)
+        t_gen = timeit(lambda: main.generate_trip_table(routes, days, seed=0), repeat=3)
+        t_index = timeit(lambda: main.TripIndex(table), repeat=3)
+        print(f"  {n_routes:3d} маршрутов, {len(table):7d} рейсов: таблица {t_gen*1000:7.1f}, "
+              f"индекс {t_index*1000:7.1f}")
+
+def bench_selection(pop_size=10000, elite_size=10, seed=0):
+    """
+    Накладные расходы селекции за поколение: сортировка пар (fitness, ind)
+    с турнирами selection() против top_k + select_parents по массиву фитнесов,
+    в сравнении с оценкой фитнеса поколения.
+    """
+    rng = random.Random(seed)
+    fits = [rng.random() for _ in range(pop_size)]
+    population = list(range(pop_size))  # для селекции содержимое особей не важно
+    parents = pop_size - elite_size
+
+    def sorted_pairs():
+        scored = sorted(zip(fits, population), key=lambda x: x[0], reverse=True)
+        [scored[i][1] for i in range(elite_size)]
+        [main.selection(scored) for _ in range(parents)]
+
+    random.seed(seed)
+    sample = [main.init_individual() for _ in range(200)]
+    t_eval = timeit(lambda: main.fitness_batch(sample), repeat=3) * pop_size / len(sample)
+    print(f"Селекция за поколение, POP_SIZE={pop_size} (лучшее из 5, мс):")
+    print(f"  оценка фитнеса поколения (оценка по 200 особям): {t_eval*1000:9.1f}")
+    t_old = timeit(sorted_pairs)
+    print(f"  сортировка + selection():        {t_old*1000:7.2f} ({t_old/t_eval:.2%} от оценки)")
+    t_top = timeit(lambda: main.top_k(fits, elite_size))
+    print(f"  top_k (элита):                   {t_top*1000:7.2f}")
+    for scheme in main.SELECTION_SCHEMES:
+        t = timeit(lambda: main.select_parents(fits, parents, scheme))
+        print(f"  select_parents('{scheme}'):{' '*(10 - len(scheme))}{t*1000:7.2f} "
+              f"({(t + t_top)/t_eval:.2%} от оценки)")
+
+def bench_memetic(generations=200, seed=0):
+    """
+    Поколений и секунд до расписания без штрафов: ГА без локального поиска
+    против меметического этапа для лучших особей.
+    """
+    print(f"Время до расписания без штрафов (бюджет {generations} поколений):")
+    for memetic in (0, 2, 5):
+        problem = main.Scheduler(seed=seed)
+        t0 = time.perf_counter()
+        reached = None
+        with problem.random_state() as index:
+            for stats in main.iter_genetic_algorithm(index=index, generations=generations,
+                                                     memetic=memetic):
+                penalties = stats['penalties']
+                if sum(v for k, v in penalties.items() if k != 'driver_rules') == 0:
+                    reached = stats['generation'] + 1
+                    break
+        elapsed = time.perf_counter() - t0
+        result = f"достигнуто за {reached} пок." if reached is not None else "не достигнуто"
+        print(f"  memetic={memetic}: {result}, {elapsed:6.2f} с, фитнес {stats['best_so_far']:.4f}")
+
+def bench_replan(generations=200, seed=0):
+    """
+    Перепланирование при сбое (недоступен автобус 3 / водитель A1):
+    replan с бюджетом 1 с против повторного запуска ГА с нуля.
+    """
+    problem = main.Scheduler(seed=seed)
+    best, best_fit = problem.genetic_algorithm(generations=generations, memetic=2)
+    print(f"Перепланирование (исходный фитнес {best_fit:.4f}):")
+    for disruption in ({'unavailable_buses': [3]}, {'unavailable_drivers': [('A', 1)]}):
+        _, fit, report = problem.replan(best, time_budget=1.0, seed=seed, **disruption)
+        print(f"  {disruption}: фитнес {fit:.4f} за {report['elapsed']*1000:6.1f} мс, "
+              f"дни {report['days']}, снято {report['stripped']}, "
+              f"не назначено {report['unassigned']}, изменено генов {report['changed']}")
+    t0 = time.perf_counter()
+    _, rerun_fit = problem.genetic_algorithm(generations=generations, memetic=2)
+    print(f"  повторный ГА с нуля: фитнес {rerun_fit:.4f} за {time.perf_counter()-t0:6.2f} с")
+
+def bench_export(days=30, n_routes=40, directory='/tmp'):
+    """
+    Экспорт жадного расписания большого набора рейсов в CSV, JSON Lines
+    и двоичный столбцовый формат: время записи, размер файла, время загрузки.
+    """
+    routes = [{'id': r, 'depot': 1 + r % 4, 'duration': (40, 80),
+               'headway': 12, 'peak_headway': 6} for r in range(1, n_routes + 1)]
+    index = main.TripIndex(main.generate_trip_table(routes, days, seed=0))
+    schedule = main.greedy_algorithm(index)
+    print(f"Экспорт расписания, {len(index)} рейсов:")
+    for name, export in (('csv', main.export_csv), ('jsonl', main.export_jsonl),
+                         ('bin', main.export_binary)):
+        path = os.path.join(directory, f"bench_schedule.{name}")
+        t0 = time.perf_counter()
+        export(schedule, path, index)
+        t_write = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        loaded, _ = main.load_schedule(path, index)
+        t_load = time.perf_counter() - t0
+        assert loaded.key() == schedule.key()
+        print(f"  {name:5s}: запись {t_write:5.2f} с, {os.path.getsize(path)/2**20:6.1f} МБ, "
+              f"загрузка {t_load:5.2f} с")
+        os.remove(path)
+
+# ВОСПРОИЗВОДИМЫЙ НАБОР ЗАМЕРОВ
+# Пути оценки фитнеса в ГА: параметры iter_genetic_algorithm
+EVAL_PATHS = {
+    'batch':       {'cache_size': 0},
+    'cache':       {},
+    'incremental': {'incremental': True, 'cache_size': 0},
+    'parallel':    {'workers': 2, 'cache_size': 0},
+}
+SUITE_DAYS      = (7, 30, 90)
+SUITE_POP_SIZES = (100, 1000, 10000)
+# Число маршрутов: 0 - один маршрут по умолчанию (generate_possible_trips)
+SUITE_ROUTES    = (0, 10)
+SUITE_HEADWAY   = 30
+
+def suite_routes(n_routes, headway=SUITE_HEADWAY):
+    """
+    Маршруты для generate_trip_table: n_routes маршрутов с интервалом headway
+    (в час пик - вдвое чаще). При n_routes=0 - None, то есть маршрут по умолчанию.
+    Вместе с days задаёт число рейсов независимо от длины горизонта.
+    """
+    if not n_routes:
+        return None
+    return [{'id': r, 'depot': 1 + r % 4, 'duration': (40, 80),
+             'headway': headway, 'peak_headway': max(headway // 2, 1)}
+            for r in range(1, n_routes + 1)]
+
+def run_config(days, pop_size, path, generations, time_budget, target, seed,
+               n_routes=0, headway=SUITE_HEADWAY):
+    """
+    Один замер: ГА на задаче Scheduler(days, suite_routes(n_routes, headway), seed)
+    с POP_SIZE=pop_size и путём оценки path не дольше generations поколений
+    и time_budget секунд. Выполняется в отдельном процессе, поэтому пиковая
+    память (ru_maxrss) относится только к этому замеру.
+    """
+    problem = main.Scheduler(days=days, routes=suite_routes(n_routes, headway), seed=seed)
+    main.POP_SIZE = pop_size
+    profiler = main.Profiler()
+    t0 = time.perf_counter()
+    reached = None
+    stats = None
+    gens = 0
+    with problem.random_state() as index:
+        for stats in main.iter_genetic_algorithm(index=index, generations=generations,
+                                                 time_budget=time_budget, profiler=profiler,
+                                                 **EVAL_PATHS[path]):
+            gens += 1
+            if reached is None and stats['best_so_far'] >= target:
+                reached = time.perf_counter() - t0
+    elapsed = time.perf_counter() - t0
+    # Реально выполненные оценки фитнеса (без попаданий в кэш):
+    #   - cache: промахи кэша;
+    #   - incremental: полные fitness_state начальной популяции (внутри evaluate)
+    #     и инкрементальные оценки потомков в offspring_state;
+    #   - batch/parallel: вся популяция на каждом вызове evaluate.
+    eval_calls, eval_time = profiler.stages['evaluate']
+    offspring_calls, offspring_time = profiler.stages['offspring_state']
+    eval_time += offspring_time
+    if path == 'cache':
+        scorings = stats['cache_misses']
+    elif path == 'incremental':
+        scorings = pop_size + offspring_calls
+    else:
+        scorings = eval_calls*pop_size
+    gen_time = profiler.stages['generation'][1]
+    return {
+        'days': days, 'routes': n_routes, 'headway': headway if n_routes else None,
+        'trips': len(index), 'pop_size': pop_size, 'path': path, 'seed': seed,
+        'generations': gens,
+        'stop_reason': stats['stop_reason'],
+        'total_time': elapsed,
+        'scorings': scorings,
+        'evals_per_sec': scorings / eval_time if eval_time else None,
+        'gens_per_sec': gens / gen_time if gen_time else None,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'best_fitness': stats['best_so_far'],
+        'target': target,
+        'time_to_target': reached,
+    }
+
+def run_suite(days=SUITE_DAYS, pop_sizes=SUITE_POP_SIZES, paths=tuple(EVAL_PATHS),
+              generations=20, time_budget=60.0, target=0.8, seed=0, log=print,
+              routes=SUITE_ROUTES, headway=SUITE_HEADWAY):
+    """
+    Все сочетания days x routes x pop_sizes x paths, каждое - в свежем процессе
+    (fork) с одинаковым seed. Число маршрутов routes (и интервал headway) -
+    отдельная от days ось числа рейсов. Возвращает словарь с описанием
+    окружения и списком замеров.
+    """
+    context = multiprocessing.get_context('fork')
+    results = []
+    for d in days:
+        for n_routes in routes:
+            for pop_size in pop_sizes:
+                for path in paths:
+                    with ProcessPoolExecutor(1, mp_context=context) as executor:
+                        record = executor.submit(run_config, d, pop_size, path, generations,
+                                                 time_budget, target, seed,
+                                                 n_routes, headway).result()
+                    results.append(record)
+                    if log is not None:
+                        log(f"{d:3d} дн., {n_routes:3d} марш. ({record['trips']:7d} рейсов), "
+                            f"POP_SIZE={pop_size:6d}, {path:11s}: "
+                            f"{record['evals_per_sec']:9.0f} оценок/с, "
+                            f"{record['gens_per_sec']:7.2f} пок./с, "
+                            f"{record['peak_rss_mb']:7.1f} МБ")
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'parameters': {'generations': generations, 'time_budget': time_budget,
+                       'target': target, 'seed': seed, 'headway': headway},
+        'results': results,
+    }
+
+def write_suite_csv(suite, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(suite['results'][0]))
+        writer.writeheader()
+        writer.writerows(suite['results'])
+
+def suite_main(argv):
+    parser = argparse.ArgumentParser(prog='bench.py suite',
+                                     description="Воспроизводимый набор замеров ГА")
+    parser.add_argument('--days', type=int, nargs='+', default=list(SUITE_DAYS))
+    parser.add_argument('--routes', type=int, nargs='+', default=list(SUITE_ROUTES),
+                        help="число маршрутов (0 - маршрут по умолчанию)")
+    parser.add_argument('--headway', type=int, default=SUITE_HEADWAY,
+                        help="интервал движения маршрутов, мин")
+    parser.add_argument('--pop-sizes', type=int, nargs='+', default=list(SUITE_POP_SIZES))
+    parser.add_argument('--paths', nargs='+', choices=list(EVAL_PATHS), default=list(EVAL_PATHS))
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--time-budget', type=float, default=60.0,
+                        help="не больше секунд на один замер")
+    parser.add_argument('--target', type=float, default=0.8,
+                        help="целевой фитнес для time_to_target")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="JSON-файл результатов (по умолчанию - stdout)")
+    parser.add_argument('--csv', help="дополнительно записать замеры в CSV")
+    args = parser.parse_args(argv)
+    suite = run_suite(args.days, args.pop_sizes, args.paths, args.generations,
+                      args.time_budget, args.target, args.seed,
+                      log=lambda line: print(line, file=sys.stderr),
+                      routes=args.routes, headway=args.headway)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(suite, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(suite, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    if args.csv:
+        write_suite_csv(suite, args.csv)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['suite']:
+        suite_main(sys.argv[2:])
+    else:
+        bench_bus_constraints()
+        bench_parallel_scaling()
+        bench_chromosome_memory()
+        bench_early_stopping()
+        bench_seeding()
+        bench_driver_constraints()
+        bench_islands()
+        bench_trip_generation()
+        bench_selection()
+        bench_memetic()
+        bench_replan()
+        bench_export()
@@ -1,4 +1,19 @@
+import bisect
+import csv
+import hashlib
+import heapq
+import json
+import os
+import pickle
 import random
+import struct
+import time
+from array import array
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from itertools import compress
+from operator import itemgetter, mul, truth
+from types import SimpleNamespace
 
 START_TIME = 6 * 60   # 6:00
 END_TIME   = 27 * 60  # 3:00 (следующего дня)
@@ -8,6 +23,7 @@ TOTAL_TIME = END_TIME - START_TIME  # 21 час
 PEAK_TIMES = [(7 * 60, 9 * 60), (17 * 60, 19 * 60)]
 
 BASE_BUSES = 8
+MAX_DRIVER_ID = 30  # Размер пула водителей: ID в random_driver_assignment и W_max в фитнесе
 
 # Штрафы
 PENALTY_NO_LUNCH_A    = 10  # Отсутствие обеда (1ч) при работе >4ч у водителя А
@@ -25,6 +41,12 @@ POP_SIZE       = 100
 GENERATIONS    = 500
 CROSSOVER_PROB = 0.9
 MUTATION_PROB  = 0.001
+TOURNAMENT_SIZE = 5  # Число участников турнира при селекции
+
+# Адаптивные вероятности операторов (iter_genetic_algorithm(adaptive=True))
+DIVERSITY_TARGET       = 0.2   # Разнообразие популяции, при котором операторы работают в обычном режиме
+ADAPTIVE_MUTATION_MAX  = 0.02  # Вероятность мутации гена при полностью сошедшейся популяции
+ADAPTIVE_CROSSOVER_MIN = 0.6   # Вероятность кроссовера при полностью сошедшейся популяции
 
 # Коэффициенты фитнес-функции
 ALPHA = 10.0           # Важность максимизации количества рейсов
@@ -37,18 +59,21 @@ DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четв
 
 
 # ГЕНЕРАЦИЯ ВОЗМОЖНЫХ РЕЙСОВ
-def generate_possible_trips():
+def generate_possible_trips(days=DAYS, rng=None):
     """
-    Генерируем все потенциальные рейсы на 7 дней.
+    Генерируем все потенциальные рейсы на days дней (по умолчанию DAYS = 7).
     Каждый рейс длится 1ч ± 10 мин (50..70).
     Расписание строим пока есть место в интервале с 6:00 до 3:00 (21 час).
+    rng - генератор случайных чисел (по умолчанию модуль random).
     """
+    if rng is None:
+        rng = random
     trips = []
     trip_id = 1
-    for day in range(DAYS):
+    for day in range(days):
         start = 0
         while True:
-            route_time = random.randint(50, 70)  # Случайная длительность 50..70 мин
+            route_time = rng.randint(50, 70)  # Случайная длительность 50..70 мин
             if start + route_time <= TOTAL_TIME:
                 trips.append({
                     'id': trip_id,
@@ -63,7 +88,113 @@ def generate_possible_trips():
                 break
     return trips
 
-POSSIBLE_TRIPS = generate_possible_trips()
+# ТАБЛИЦА РЕЙСОВ ДЛЯ НЕСКОЛЬКИХ МАРШРУТОВ И ДЕПО
+# Маршрут по умолчанию: рейсы 50..70 мин, интервал 30 мин, в часы пик - 15 мин
+DEFAULT_ROUTE = {'id': 1, 'depot': 1, 'duration': (50, 70), 'headway': 30, 'peak_headway': 15}
+
+def headway_bands(route):
+    """
+    Интервалы движения маршрута по временным полосам: список (начало, конец, интервал),
+    покрывающий START_TIME..END_TIME. Если у маршрута нет явных 'headways',
+    в PEAK_TIMES действует 'peak_headway', в остальное время - 'headway'.
+    """
+    if 'headways' in route:
+        return sorted(route['headways'])
+    bands = []
+    t = START_TIME
+    for (sp, ep) in sorted(PEAK_TIMES):
+        if t < sp:
+            bands.append((t, sp, route['headway']))
+        bands.append((sp, ep, route.get('peak_headway', route['headway'])))
+        t = ep
+    if t < END_TIME:
+        bands.append((t, END_TIME, route['headway']))
+    return bands
+
+class TripTable:
+    """
+    Столбцовая таблица рейсов (позиция = индекс рейса):
+    ids, routes, depots, days, starts, ends, durations - массивы array('i').
+    Компактна в памяти и строится без словаря на каждый рейс;
+    table[i] возвращает рейс в прежнем виде словаря.
+    """
+    COLUMNS = ('ids', 'routes', 'depots', 'days', 'starts', 'ends', 'durations')
+
+    def __init__(self):
+        for name in self.COLUMNS:
+            setattr(self, name, array('i'))
+
+    @classmethod
+    def from_trips(cls, trips):
+        """
+        Таблица из списка словарей generate_possible_trips() (маршрут и депо - 1,
+        если не указаны).
+        """
+        table = cls()
+        table.ids.extend(t['id'] for t in trips)
+        table.routes.extend(t.get('route', 1) for t in trips)
+        table.depots.extend(t.get('depot', 1) for t in trips)
+        table.days.extend(t['day'] for t in trips)
+        table.starts.extend(t['start_min'] for t in trips)
+        table.ends.extend(t['end_min'] for t in trips)
+        table.durations.extend(t['duration'] for t in trips)
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return {'id': self.ids[i], 'route': self.routes[i], 'depot': self.depots[i],
+                'day': self.days[i], 'start_min': self.starts[i],
+                'end_min': self.ends[i], 'duration': self.durations[i]}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+def generate_trip_table(routes=(DEFAULT_ROUTE,), days=DAYS, seed=None, rng=None):
+    """
+    Генерируем рейсы нескольких маршрутов (и депо) на days дней в TripTable.
+    Маршрут - словарь: 'id', 'depot', 'duration' (мин, макс) в минутах,
+    'headway'/'peak_headway' или явные полосы 'headways' (см. headway_bands),
+    необязательный 'offset' - сдвиг первого отправления от START_TIME.
+    Рейсы отправляются с интервалом текущей полосы, пока успевают
+    завершиться до END_TIME. Результат воспроизводим по seed
+    (используется собственный random.Random, глобальное состояние не меняется)
+    либо берётся из переданного генератора rng.
+    """
+    if rng is None:
+        rng = random.Random(seed)
+    randint = rng.randint
+    table = TripTable()
+    plans = []
+    for route in routes:
+        bands = headway_bands(route)
+        departures = []
+        t = START_TIME + route.get('offset', 0)
+        k = 0
+        while t < END_TIME:
+            while k < len(bands) - 1 and t >= bands[k][1]:
+                k += 1
+            departures.append(t)
+            t += bands[k][2]
+        plans.append((route['id'], route['depot'], route['duration'], departures))
+
+    ids, r_col, d_col = table.ids, table.routes, table.depots
+    day_col, s_col, e_col, dur_col = table.days, table.starts, table.ends, table.durations
+    for day in range(days):
+        for (route_id, depot, (lo, hi), departures) in plans:
+            durations = [randint(lo, hi) for _ in departures]
+            kept = [(s, d) for s, d in zip(departures, durations) if s + d <= END_TIME]
+            n = len(kept)
+            r_col.extend([route_id]*n)
+            d_col.extend([depot]*n)
+            day_col.extend([day]*n)
+            s_col.extend(s for s, _ in kept)
+            e_col.extend(s + d for s, d in kept)
+            dur_col.extend(d for _, d in kept)
+    ids.extend(range(1, len(day_col) + 1))
+    return table
+
 
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 def format_time(m):
@@ -84,17 +215,20 @@ def is_peak(minute_of_day):
             return True
     return False
 
-def random_driver_assignment():
+def random_driver_assignment(max_driver_id=None):
     """
     Случайное назначение водителя.
     20% - водитель не назначается (None, None).
-    Иначе 70% - тип 'A', 30% - тип 'B'.
+    Иначе 70% - тип 'A', 30% - тип 'B', ID в диапазоне 1..max_driver_id
+    (по умолчанию MAX_DRIVER_ID).
     Возвращаем кортеж (dt, did).
     """
+    if max_driver_id is None:
+        max_driver_id = MAX_DRIVER_ID
     if random.random() < 0.2:
         return None, None
     dt = random.choices(['A','B'], weights=[70,30], k=1)[0]
-    did = random.randint(1,30)
+    did = random.randint(1,max_driver_id)
     return dt, did
 
 def random_bus_assignment():
@@ -107,178 +241,502 @@ def random_bus_assignment():
         return None
     return random.randint(1,12)
 
+# ИНДЕКС РЕЙСОВ
+class TripIndex:
+    """
+    Предвычисленный столбцовый индекс набора рейсов (строится один раз
+    и переиспользуется между запусками ГА) по TripTable или списку словарей
+    generate_possible_trips():
+      - table: исходная TripTable
+      - ids, routes, depots, starts, ends, durations, days: столбцы рейсов
+        (списки, позиция = индекс рейса)
+      - peaks: флаг начала рейса в пиковое время
+      - order: индексы рейсов, упорядоченные по (day, start_min); rank - обратное отображение
+      - day_ranges: day -> (lo, hi), рейсы дня занимают order[lo:hi]
+    """
+    def __init__(self, trips):
+        if not isinstance(trips, TripTable):
+            trips = TripTable.from_trips(trips)
+        self.table = trips
+        self.ids       = trips.ids.tolist()
+        self.routes    = trips.routes.tolist()
+        self.depots    = trips.depots.tolist()
+        self.starts    = trips.starts.tolist()
+        self.ends      = trips.ends.tolist()
+        self.durations = trips.durations.tolist()
+        self.days      = trips.days.tolist()
+        peak_minutes = {m for (sp, ep) in PEAK_TIMES for m in range(sp, ep)}
+        self.peaks     = [m in peak_minutes for m in self.starts]
+        n = len(self.ids)
+        # Ключ сортировки (day, start_min) одним целым числом
+        span = max(self.starts, default=0) + 1
+        keys = [d*span + s for d, s in zip(self.days, self.starts)]
+        self.order = sorted(range(n), key=keys.__getitem__)
+        self.rank = [0]*n
+        for r, i in enumerate(self.order):
+            self.rank[i] = r
+        self.day_ranges = {}
+        days, order = self.days, self.order
+        lo = 0
+        for r in range(1, n + 1):
+            if r == n or days[order[r]] != days[order[lo]]:
+                self.day_ranges[days[order[lo]]] = (lo, r)
+                lo = r
+
+    def __len__(self):
+        return len(self.ids)
+
+# ЭКЗЕМПЛЯР ЗАДАЧИ
+class Scheduler:
+    """
+    Экземпляр задачи планирования со своим генератором случайных чисел.
+    Набор рейсов строится при первом обращении к trips/index и кэшируется:
+      - routes=None: один маршрут generate_possible_trips на days дней;
+      - иначе generate_trip_table(routes, days).
+    rng - генератор random.Random (по умолчанию random.Random(seed)).
+    Методы запуска алгоритмов выполняются на index этого экземпляра
+    с состоянием модуля random, подменённым состоянием rng (см. random_state),
+    так что несколько экземпляров в одном процессе не влияют друг на друга.
+    """
+    def __init__(self, days=DAYS, routes=None, seed=None, rng=None):
+        self.days = days
+        self.routes = routes
+        self.rng = rng if rng is not None else random.Random(seed)
+        self._trips = None
+        self._index = None
+
+    @property
+    def trips(self):
+        if self._trips is None:
+            if self.routes is None:
+                self._trips = generate_possible_trips(self.days, self.rng)
+            else:
+                self._trips = generate_trip_table(self.routes, self.days, rng=self.rng)
+        return self._trips
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = TripIndex(self.trips)
+        return self._index
+
+    @contextmanager
+    def random_state(self):
+        """
+        Операторы ГА используют модуль random: на время блока его состояние
+        заменяется состоянием rng, после блока rng продолжает с того же места,
+        а модулю random возвращается прежнее состояние.
+        """
+        index = self.index  # рейсы строятся из rng до подмены состояния
+        saved = random.getstate()
+        random.setstate(self.rng.getstate())
+        try:
+            yield index
+        finally:
+            self.rng.setstate(random.getstate())
+            random.setstate(saved)
+
+    def genetic_algorithm(self, **kwargs):
+        with self.random_state() as index:
+            return genetic_algorithm(index=index, **kwargs)
+
+    def island_genetic_algorithm(self, **kwargs):
+        with self.random_state() as index:
+            return island_genetic_algorithm(index=index, **kwargs)
+
+    def replan(self, ind, **kwargs):
+        return replan(ind, index=self.index, **kwargs)
+
+    def greedy_algorithm(self, **kwargs):
+        return greedy_algorithm(index=self.index, **kwargs)
+
+    def fitness(self, ind):
+        return fitness(ind, self.index)
+
+    def display_schedule(self, ind):
+        display_schedule(ind, self.index)
+
+_default_scheduler = None
+
+def default_scheduler():
+    """
+    Экземпляр задачи по умолчанию (создаётся при первом обращении).
+    """
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = Scheduler()
+    return _default_scheduler
+
+def default_index():
+    """
+    TripIndex задачи по умолчанию - используется, когда index не передан.
+    """
+    return default_scheduler().index
+
+def __getattr__(name):
+    # POSSIBLE_TRIPS и TRIP_INDEX строятся не при импорте, а при первом обращении
+    if name == 'POSSIBLE_TRIPS':
+        return default_scheduler().trips
+    if name == 'TRIP_INDEX':
+        return default_index()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ХРОМОСОМА
+DRIVER_TYPE_CODES = {'A': 1, 'B': 2}
+DRIVER_TYPES = {1: 'A', 2: 'B'}
+
+class Chromosome:
+    """
+    Компактная хромосома: три параллельных столбца array('h'),
+    позиция в столбце = индекс рейса в TripIndex (trip_id не хранится).
+      - types: тип водителя (0 - не назначен, 1 - A, 2 - B)
+      - ids:   ID водителя (0 - не назначен)
+      - buses: номер автобуса (0 - не назначен)
+    Рейс выполняется, только если назначены и водитель, и автобус.
+    """
+    __slots__ = ('types', 'ids', 'buses')
+
+    def __init__(self, types, ids, buses):
+        self.types = types
+        self.ids = ids
+        self.buses = buses
+
+    @classmethod
+    def empty(cls, n):
+        """
+        Хромосома из n рейсов без назначений.
+        """
+        return cls(array('h', bytes(2*n)), array('h', bytes(2*n)), array('h', bytes(2*n)))
+
+    @classmethod
+    def from_genes(cls, genes, index=None):
+        """
+        Конвертация из старого представления - списка генов (trip_id, dt, did, b).
+        """
+        if index is None:
+            index = default_index()
+        index_of = {trip_id: i for i, trip_id in enumerate(index.ids)}
+        ind = cls.empty(len(index))
+        for (trip_id, dt, did, b) in genes:
+            ind.set_gene(index_of[trip_id], dt, did, b)
+        return ind
+
+    def __len__(self):
+        return len(self.types)
+
+    def gene(self, i):
+        """
+        Ген рейса i в виде (dt, did, b), неназначенные поля - None.
+        """
+        code = self.types[i]
+        b = self.buses[i]
+        return (DRIVER_TYPES[code] if code else None,
+                self.ids[i] if code else None,
+                b if b else None)
+
+    def set_gene(self, i, dt, did, b):
+        """
+        Записываем ген рейса i; None - поле не назначено.
+        """
+        if dt is None or did is None:
+            self.types[i] = 0
+            self.ids[i] = 0
+        else:
+            self.types[i] = DRIVER_TYPE_CODES[dt]
+            self.ids[i] = did
+        self.buses[i] = b if b is not None else 0
+
+    def copy(self):
+        return Chromosome(self.types[:], self.ids[:], self.buses[:])
+
+    def key(self):
+        """
+        Неизменяемый ключ содержимого хромосомы (для кэша фитнеса).
+        """
+        return self.types.tobytes() + self.ids.tobytes() + self.buses.tobytes()
+
+    def digest(self):
+        """
+        16-байтовый хэш содержимого (blake2b от key): ключ фиксированного
+        размера, не растущий с числом рейсов.
+        """
+        return hashlib.blake2b(self.key(), digest_size=16).digest()
+
+    def to_genes(self, index=None):
+        """
+        Старое представление: список генов (trip_id, dt, did, b).
+        """
+        if index is None:
+            index = default_index()
+        return [(trip_id,) + self.gene(i) for i, trip_id in enumerate(index.ids)]
+
 # ИНИЦИАЛИЗАЦИЯ ОДНОГО ИНДИВИДУУМА ДЛЯ ГА
-def init_individual():
+def init_individual(index=None):
     """
-    Каждый ген представляет собой: (trip_id, dt, did, b).
-    - trip_id: идентификатор рейса
+    Для каждого рейса хромосомы назначаем:
     - dt, did: тип и ID водителя
     - b: номер автобуса
-    С вероятностью 20% рейс пропускаем (назначаем None).
+    С вероятностью 20% рейс пропускаем (оставляем без назначения).
     """
-    individual = []
-    for trip in POSSIBLE_TRIPS:
-        trip_id = trip['id']
+    if index is None:
+        index = default_index()
+    individual = Chromosome.empty(len(index))
+    for i in range(len(index)):
         # 20% вероятность пропустить рейс
         if random.random() < 0.2:
-            individual.append((trip_id, None, None, None))
-        else:
-            dt, did = random_driver_assignment()
-            b = random_bus_assignment()
-            if dt is None or b is None:
-                individual.append((trip_id, None, None, None))
-            else:
-                individual.append((trip_id, dt, did, b))
+            continue
+        dt, did = random_driver_assignment()
+        b = random_bus_assignment()
+        if dt is not None and b is not None:
+            individual.set_gene(i, dt, did, b)
     return individual
 
 # ДЕКОДИРОВАНИЕ ИНДИВИДУУМА
 def decode_individual(ind):
     """
-    Превращаем список генов (trip_id, dt, did, b) обратно в расписание.
-    Расписание: list из (trip_dict, dt, did, b).
-    trip_dict берём из POSSIBLE_TRIPS по trip_id.
+    Превращаем хромосому обратно в расписание.
+    Расписание: list из (i, dt, did, b), где i - индекс рейса в TripIndex.
     """
-    trip_map = {trip['id']: trip for trip in POSSIBLE_TRIPS}
-    schedule = []
-    for gene in ind:
-        trip_id, dt, did, b = gene
-        trip = trip_map[trip_id]
-        schedule.append((trip, dt, did, b))
-    return schedule
+    return [(i,) + ind.gene(i) for i in range(len(ind))]
 
 # ПРОВЕРКА ОГРАНИЧЕНИЙ И ШТРАФЫ
-def check_driver_constraints(schedule):
+DRIVER_RULES = ('a_no_lunch', 'a_overtime', 'b_short_break',
+                'b_long_break', 'b_overtime', 'b_no_rest')
+
+def driver_timeline_penalties(dt, trips, index):
     """
-    Считает штрафы за нарушения графиков водителей (A и B).
-    - Тип А: свыше 9ч суммарно (OVERTIME), отсутствие обеда после 4ч без перерыва ≥60мин.
-    - Тип B: свыше 12ч (720 мин), каждые 2ч нужен короткий перерыв 15..20мин,
-      не более 2 коротких подряд -> нужен ≥60мин,
-      "сутки через двое" - штраф (PENALTY_B_NO_2DAY_REST), если B работает в смежные дни (d+1, d+2).
+    Штрафы одного водителя за один линейный проход по его рейсам.
+    trips - индексы рейсов водителя в хронологическом порядке (как в index.order).
+    Рабочие дни копятся битовой маской для правила "сутки через двое".
+    Возвращает список штрафов в порядке DRIVER_RULES.
     """
+    starts, ends, durations, days = index.starts, index.ends, index.durations, index.days
+    p = [0]*6
+    day_mask = 0
+    cur_day = None
+    work = work_acc = short_breaks = last_end = last_dur = 0
+    lunch = False
+    for i in trips:
+        d = days[i]
+        if d != cur_day:
+            if cur_day is not None:
+                _close_driver_day(dt, p, work, lunch, work_acc - last_dur)
+            cur_day = d
+            day_mask |= 1 << d
+            work = work_acc = short_breaks = 0
+            lunch = False
+        else:
+            gap = starts[i] - last_end
+            if dt == 'A':
+                # Обед: перерыв >=60 мин после того, как наработано >=4ч
+                if work >= 240 and gap >= 60:
+                    lunch = True
+            elif work_acc >= 120:
+                # Каждые 2ч нужен короткий перерыв >=15мин (или >=60мин каждые 2 коротких)
+                if gap < 15:
+                    p[2] += PENALTY_B_SHORT_BREAK
+                elif gap < 60:
+                    short_breaks += 1
+                    if short_breaks > 2:
+                        p[3] += PENALTY_B_LONG_BREAK
+                else:
+                    short_breaks = 0
+                work_acc = 0
+        dur = durations[i]
+        work += dur
+        work_acc += dur
+        last_end = ends[i]
+        last_dur = dur
+    if cur_day is not None:
+        _close_driver_day(dt, p, work, lunch, work_acc - last_dur)
+    if dt == 'B':
+        # "Сутки через двое": день d штрафуется, если водитель работает и в d+1 или d+2
+        p[5] = bin(day_mask & ((day_mask >> 1) | (day_mask >> 2))).count('1')*PENALTY_B_NO_2DAY_REST
+    return p
+
+def _close_driver_day(dt, p, work, lunch, open_block):
+    """
+    Итоговые штрафы дня водителя: переработка, обед (A),
+    незакрытый перерывом блок >=2ч перед последним рейсом (B).
+    """
+    if dt == 'A':
+        if work > 540:  # 9ч = 540 мин
+            p[1] += PENALTY_OVERTIME_A
+        if work > 240 and not lunch:  # 4ч = 240 мин
+            p[0] += PENALTY_NO_LUNCH_A
+    else:
+        if work > 720:
+            p[4] += PENALTY_OVERTIME_B
+        if open_block >= 120:
+            p[2] += PENALTY_B_SHORT_BREAK
+
+def driver_penalty_breakdown(schedule, index=None):
+    """
+    Штрафы за нарушения графиков водителей по правилам DRIVER_RULES.
+    - Тип А: свыше 9ч суммарно (a_overtime), отсутствие обеда после 4ч без перерыва ≥60мин (a_no_lunch).
+    - Тип B: свыше 12ч (b_overtime), каждые 2ч нужен короткий перерыв 15..20мин (b_short_break),
+      не более 2 коротких подряд -> нужен ≥60мин (b_long_break),
+      "сутки через двое" - штраф (b_no_rest), если B работает в смежные дни (d+1, d+2).
+    """
+    if index is None:
+        index = default_index()
+    # Гены по индексу рейса (расписание может быть неполным или в любом порядке)
+    by_trip = [None]*len(index)
+    for gene in schedule:
+        by_trip[gene[0]] = gene
     drivers_map = {}
-    for (t, dt, did, b) in schedule:
-        # Трекер для каждого (dt, did), собираем их рейсы
+    # Обходим рейсы в хронологическом порядке index.order, собирая их по водителям
+    for i in index.order:
+        gene = by_trip[i]
+        if gene is None:
+            continue
+        _, dt, did, b = gene
         if dt is not None and did is not None and b is not None:
             key = (dt, did)
             if key not in drivers_map:
                 drivers_map[key] = []
-            drivers_map[key].append(t)
+            drivers_map[key].append(i)
+
+    totals = dict.fromkeys(DRIVER_RULES, 0)
+    for (dt, did), trips in drivers_map.items():
+        for rule, value in zip(DRIVER_RULES, driver_timeline_penalties(dt, trips, index)):
+            totals[rule] += value
+    return totals
 
+def check_driver_constraints(schedule, index=None):
+    """
+    Суммарный штраф за нарушения графиков водителей (см. driver_penalty_breakdown).
+    """
+    return sum(driver_penalty_breakdown(schedule, index).values())
+
+def bus_load_penalty(events):
+    """
+    Штраф за превышение BASE_BUSES одновременно работающих автобусов в пределах одного дня.
+    events - список (минута окна, +1/-1) начал и окончаний рейсов.
+    Метод заметающей прямой: O(k log k) по числу рейсов, а не по числу минут.
+    """
+    events.sort()
     penalties = 0
+    usage = 0
+    prev = 0
+    for m, delta in events:
+        if usage > BASE_BUSES and m > prev:
+            penalties += (usage - BASE_BUSES)*(m - prev)*PENALTY_BUS_CONFLICT
+        usage += delta
+        prev = m
+    return penalties
 
-    for drv_key, trips in drivers_map.items():
-        dt, did = drv_key
-        # Сортируем рейсы по дню и времени начала, чтобы анализировать суммарно
-        trips.sort(key=lambda x: (x['day'], x['start_min']))
-        trips_by_day = {}
-        for tr in trips:
-            day = tr['day']
-            if day not in trips_by_day:
-                trips_by_day[day] = []
-            trips_by_day[day].append(tr)
-
-        # Штраф за отсутствие "сутки через двое" у B (если появляются в d, d+1 или d+2)
-        if dt == 'B':
-            used_days = sorted(trips_by_day.keys())
-            for d in used_days:
-                # если водитель B есть в day d, штрафуем если он же в day d+1 или d+2
-                if (d+1 in used_days) or (d+2 in used_days):
-                    penalties += PENALTY_B_NO_2DAY_REST
-
-        # Для каждого дня считаем суммарную работу и перерывы
-        for day, day_trips in trips_by_day.items():
-            total_work = sum(tr['duration'] for tr in day_trips)
-            intervals = []
-            for i in range(len(day_trips)-1):
-                gap = day_trips[i+1]['start_min'] - day_trips[i]['end_min']
-                intervals.append(gap)
+def day_bus_events(trip_indices, index):
+    """
+    События (минута окна, +1/-1) для рейсов одного дня - вход bus_load_penalty.
+    """
+    events = []
+    for i in trip_indices:
+        start_i = max(index.starts[i] - START_TIME, 0)
+        end_i   = min(index.ends[i] - START_TIME, TOTAL_TIME)
+        if start_i < end_i:
+            events.append((start_i, 1))
+            events.append((end_i, -1))
+    return events
 
-            if dt == 'A':
-                # Проверка на переработку (>9ч)
-                if total_work > 540:  # 9ч = 540 мин
-                    penalties += PENALTY_OVERTIME_A
-                # Проверка на обед (если суммарная работа >4ч, но нет перерыва >=60мин)
-                if total_work > 240:  # 4ч = 240 мин
-                    had_lunch = False
-                    running_time = 0
-                    for i, g in enumerate(intervals):
-                        running_time += day_trips[i]['duration']
-                        if running_time >= 240 and g >= 60:
-                            had_lunch = True
-                            break
-                    if not had_lunch:
-                        penalties += PENALTY_NO_LUNCH_A
-
-            if dt == 'B':
-                # Проверка на >12ч
-                if total_work > 720:
-                    penalties += PENALTY_OVERTIME_B
-                # Каждые 2ч нужен короткий перерыв >=15мин (или >=60мин каждые 2 коротких)
-                work_acc = 0
-                short_break_count = 0
-                for i in range(len(day_trips)-1):
-                    work_acc += day_trips[i]['duration']
-                    gap = intervals[i]
-                    if work_acc >= 120:  # 2 часа = 120 мин
-                        if gap < 15:
-                            penalties += PENALTY_B_SHORT_BREAK
-                        else:
-                            if gap < 60:
-                                short_break_count += 1
-                                if short_break_count > 2:
-                                    penalties += PENALTY_B_LONG_BREAK
-                            else:
-                                short_break_count = 0
-                        work_acc = 0
-                # В конце дня, если остался незакрытый блок >=2ч
-                if work_acc >= 120:
-                    penalties += PENALTY_B_SHORT_BREAK
+def bus_load_update(load, start_i, end_i, delta):
+    """
+    Поминутная загрузка автобусов дня load (array длиной TOTAL_TIME) меняется
+    на delta (+1/-1) в окне [start_i, end_i) одного рейса.
+    Возвращает изменение штрафа bus_load_penalty этого дня: O(длительность рейса),
+    а не O(рейсов за день).
+    """
+    window = load[start_i:end_i]
+    if delta > 0:
+        change = sum(1 for usage in window if usage >= BASE_BUSES)
+    else:
+        change = -sum(1 for usage in window if usage > BASE_BUSES)
+    load[start_i:end_i] = array('h', [usage + delta for usage in window])
+    return change*PENALTY_BUS_CONFLICT
 
-    return penalties
+def find_bus_double_bookings(schedule, index=None):
+    """
+    Ищем двойные бронирования: один и тот же номер автобуса
+    назначен на пересекающиеся по времени рейсы в один день.
+    Возвращает список (day, b, trip_id_1, trip_id_2) - каждую пересекающуюся
+    пару один раз, рейс trip_id_1 начинается раньше.
+    Рейсы дня и автобуса просматриваются в хронологическом порядке с кучей
+    концов ещё не завершившихся рейсов: O(k log k + число пар).
+    """
+    if index is None:
+        index = default_index()
+    by_bus_day = {}
+    for (i, dt, did, b) in schedule:
+        if b is None or dt is None or did is None:
+            continue
+        key = (index.days[i], b)
+        if key not in by_bus_day:
+            by_bus_day[key] = []
+        by_bus_day[key].append(i)
+
+    conflicts = []
+    for (day, b), bus_trips in sorted(by_bus_day.items()):
+        bus_trips.sort(key=index.rank.__getitem__)
+        # Куча (конец, ранг) рейсов, ещё идущих к началу текущего
+        active = []
+        for i in bus_trips:
+            while active and active[0][0] <= index.starts[i]:
+                heapq.heappop(active)
+            for r in sorted(r for _, r in active):
+                conflicts.append((day, b, index.ids[index.order[r]], index.ids[i]))
+            heapq.heappush(active, (index.ends[i], index.rank[i]))
+    return conflicts
 
-def check_bus_constraints(schedule):
+def check_bus_constraints(schedule, bus_aware=False, index=None):
     """
-    Подсчитываем, сколько автобусов используется в каждую минуту рабочего окна.
-    Если одновременно (в одну минуту) задействовано >BASE_BUSES, начисляем штраф.
+    Подсчитываем, сколько автобусов используется одновременно в каждый день.
+    Если одновременно (в одну минуту одного дня) задействовано >BASE_BUSES, начисляем штраф.
+    bus_aware=True дополнительно штрафует каждое двойное бронирование
+    одного номера автобуса (см. find_bus_double_bookings).
     """
-    usage = [0]*(TOTAL_TIME+1)
-    for (t, dt, did, b) in schedule:
+    if index is None:
+        index = default_index()
+    trips_by_day = {}
+    for (i, dt, did, b) in schedule:
         if b is None or dt is None or did is None:
             continue
-        start_i = t['start_min'] - START_TIME
-        end_i   = t['end_min']   - START_TIME
-        for m in range(start_i, end_i):
-            if 0 <= m < TOTAL_TIME:
-                usage[m] += 1
+        day = index.days[i]
+        if day not in trips_by_day:
+            trips_by_day[day] = []
+        trips_by_day[day].append(i)
+
     penalties = 0
-    for x in usage:
-        if x > BASE_BUSES:
-            penalties += (x - BASE_BUSES)*PENALTY_BUS_CONFLICT
+    for day_trips in trips_by_day.values():
+        penalties += bus_load_penalty(day_bus_events(day_trips, index))
+    if bus_aware:
+        penalties += len(find_bus_double_bookings(schedule, index))*PENALTY_BUS_CONFLICT
     return penalties
 
-def check_shift_change(schedule):
+def check_shift_change(schedule, index=None):
     """
     Штраф за пересменку <10 минут (PENALTY_SHIFT_CHANGE).
     Если на одном автобусе подряд идут разные водители (dt,did),
     но между рейсами меньше 10 мин, добавляем штраф.
     """
+    if index is None:
+        index = default_index()
     bus_map = {}
-    for (t, dt, did, b) in schedule:
+    for (i, dt, did, b) in schedule:
         if b is not None and dt is not None and did is not None:
             if b not in bus_map:
                 bus_map[b] = []
-            bus_map[b].append((t, dt, did))
+            bus_map[b].append((index.rank[i], i, dt, did))
 
     penalty = 0
     for bus, bus_trips in bus_map.items():
-        # Сортируем по (day, start_min)
-        bus_trips.sort(key=lambda x: (x[0]['day'], x[0]['start_min']))
-        for i in range(len(bus_trips)-1):
-            (t1, dt1, did1) = bus_trips[i]
-            (t2, dt2, did2) = bus_trips[i+1]
+        # Сортируем по (day, start_min) - т.е. по рангу в индексе
+        bus_trips.sort()
+        for k in range(len(bus_trips)-1):
+            (r1, i1, dt1, did1) = bus_trips[k]
+            (r2, i2, dt2, did2) = bus_trips[k+1]
             # Если смена водителя
             if (dt1, did1) != (dt2, did2):
-                gap = t2['start_min'] - t1['end_min']
+                gap = index.starts[i2] - index.ends[i1]
                 if gap < 10:
                     penalty += PENALTY_SHIFT_CHANGE
     return penalty
@@ -289,7 +747,7 @@ def count_buses_used(schedule):
     Вычисляем, какие номера автобусов назначены (b).
     Дополнительно считаем, если max(b) > BASE_BUSES => штраф (доп. автобусы).
     """
-    b_set = set(b for (t, dt, did, b) in schedule
+    b_set = set(b for (i, dt, did, b) in schedule
                 if b is not None and dt is not None and did is not None)
     if not b_set:
         return 0
@@ -302,7 +760,7 @@ def count_unique_drivers(schedule):
     Кол-во уникальных (dt, did) сочетаний.
     Чем меньше водителей, тем лучше (штрафы меньше).
     """
-    d_set = set((dt, did) for (t, dt, did, b) in schedule
+    d_set = set((dt, did) for (i, dt, did, b) in schedule
                 if dt is not None and did is not None and b is not None)
     return len(d_set)
 
@@ -310,19 +768,21 @@ def count_completed_trips(schedule):
     """
     Кол-во рейсов, где dt != None, did != None и b != None.
     """
-    return sum(1 for (t, dt, did, b) in schedule
+    return sum(1 for (i, dt, did, b) in schedule
                if dt is not None and did is not None and b is not None)
 
-def count_peak_trips(schedule):
+def count_peak_trips(schedule, index=None):
     """
     Кол-во рейсов, начинающихся в пиковый период (7-9 или 17-19).
     """
-    return sum(1 for (t, dt, did, b) in schedule
-               if dt is not None and did is not None and b is not None
-               and is_peak(t['start_min']))
+    if index is None:
+        index = default_index()
+    peaks = index.peaks
+    return sum(1 for (i, dt, did, b) in schedule
+               if dt is not None and did is not None and b is not None and peaks[i])
 
 # ФИТНЕС-ФУНКЦИЯ
-def fitness(ind):
+def fitness(ind, index=None):
     """
     Расчёт фитнеса:
       - R: кол-во выполненных рейсов
@@ -333,24 +793,33 @@ def fitness(ind):
       где numerator = ALPHA*(R / R_max + peak_bonus)
           denominator = numerator + BETA*(W / W_max) + penalties*0.01
     """
+    if index is None:
+        index = default_index()
     schedule = decode_individual(ind)
     R = count_completed_trips(schedule)
     W = count_unique_drivers(schedule)
     extra_buses = count_buses_used(schedule)
 
     # Штрафы
-    p_driver = check_driver_constraints(schedule)
-    p_bus    = check_bus_constraints(schedule)
-    p_shift  = check_shift_change(schedule)
+    p_driver = check_driver_constraints(schedule, index)
+    p_bus    = check_bus_constraints(schedule, index=index)
+    p_shift  = check_shift_change(schedule, index)
     p_buses_extra = extra_buses * PENALTY_TOO_MANY_BUSES
 
     # Пиковые рейсы
-    peak_count = count_peak_trips(schedule)
-    R_max = len(POSSIBLE_TRIPS)  # всего потенциальных рейсов
-    W_max = 30.0 if R_max > 0 else 1.0
+    peak_count = count_peak_trips(schedule, index)
+    R_max = len(index)  # всего потенциальных рейсов
 
-    peak_bonus = (peak_count / R_max)*PEAK_BONUS_FACTOR if R_max>0 else 0
     penalties = p_driver + p_bus + p_shift + p_buses_extra
+    return fitness_value(R, W, peak_count, penalties, R_max)
+
+def fitness_value(R, W, peak_count, penalties, R_max):
+    """
+    Итоговая формула фитнеса по уже посчитанным компонентам.
+    Вынесена отдельно, чтобы скалярный и пакетный расчёт давали одинаковый результат.
+    """
+    W_max = float(MAX_DRIVER_ID) if R_max > 0 else 1.0
+    peak_bonus = (peak_count / R_max)*PEAK_BONUS_FACTOR if R_max>0 else 0
 
     numerator   = ALPHA*(R / R_max + peak_bonus)
     denominator = ALPHA*(R / R_max + peak_bonus) + BETA*(W / W_max) + penalties*0.01
@@ -361,60 +830,1167 @@ def fitness(ind):
         fit = numerator / denominator
     return fit
 
+# ПАКЕТНАЯ ОЦЕНКА ПОПУЛЯЦИИ
+BATCH_MEMO_SIZE = 200000  # Предел записей в общих для популяции таблицах штрафов BatchScorer
+
+class BatchScorer:
+    """
+    Оценка популяции по столбцам хромосом без decode_individual.
+    Общие для всей популяции части считаются один раз:
+      - перестановка рейсов в хронологический порядок index.order
+        (itemgetter - на уровне C) и пиковые признаки в этом порядке;
+      - штраф загрузки автобусов дня - по набору назначенных рейсов дня
+        (байтовая маска), то есть один раз на различный набор в популяции;
+      - штрафы графика водителя - по типу водителя и его рейсам.
+    После кроссовера и мутации большинство дней и водителей у особей совпадают,
+    поэтому на каждую следующую особь приходятся в основном попадания в таблицы.
+    """
+    def __init__(self, index):
+        order = index.order
+        self.index = index
+        if len(order) > 1:
+            self.by_rank = itemgetter(*order)
+        else:
+            self.by_rank = lambda col: tuple(col[i] for i in order)
+        self.ranks = range(len(order))
+        self.peaks = [int(index.peaks[i]) for i in order]
+        # Столбцы рейсов по рангу: driver_timeline_penalties принимает ранги вместо индексов
+        self.chrono = SimpleNamespace(**{name: [getattr(index, name)[i] for i in order]
+                                         for name in ('starts', 'ends', 'durations', 'days')})
+        # События загрузки (см. day_bus_events) каждого рейса по рангу
+        self.events = [day_bus_events((i,), index) for i in order]
+        self.day_bounds = sorted(index.day_ranges.values())
+        self.day_pen = {}
+        self.driver_pen = {}
+
+    def day_penalty(self, lo, hi, mask):
+        key = (lo, mask[lo:hi])
+        pen = self.day_pen.get(key)
+        if pen is None:
+            events = self.events
+            pen = bus_load_penalty([ev for r in compress(range(lo, hi), key[1])
+                                    for ev in events[r]])
+            self.day_pen[key] = pen
+        return pen
+
+    def driver_penalty(self, code, ranks):
+        key = (code, tuple(ranks))
+        pen = self.driver_pen.get(key)
+        if pen is None:
+            pen = sum(driver_timeline_penalties(DRIVER_TYPES[code], ranks, self.chrono))
+            self.driver_pen[key] = pen
+        return pen
+
+    def score(self, t_col, d_col, b_col):
+        """
+        Фитнес одного индивидуума по столбцам (types, ids, buses).
+        """
+        by_rank = self.by_rank
+        T, D, B = by_rank(t_col), by_rank(d_col), by_rank(b_col)
+        # Назначенный рейс - есть и тип водителя, и автобус
+        mask = bytes(map(truth, map(mul, T, B)))
+        R = mask.count(1)
+        peak_count = sum(compress(self.peaks, mask))
+        assigned = list(compress(self.ranks, mask))
+        buses = list(compress(B, mask))
+        keys = list(zip(compress(T, mask), compress(D, mask)))
+        max_bus = max(buses, default=0)
+
+        # Водители и пересменки: один проход по назначенным рейсам
+        starts, ends = self.chrono.starts, self.chrono.ends
+        drivers = {}
+        bus_last = {}
+        p_shift = 0
+        for r, key, b in zip(assigned, keys, buses):
+            prev = bus_last.get(b)
+            if prev is not None and prev[1] != key and starts[r] - ends[prev[0]] < 10:
+                p_shift += PENALTY_SHIFT_CHANGE
+            bus_last[b] = (r, key)
+            drv = drivers.get(key)
+            if drv is None:
+                drivers[key] = drv = []
+            drv.append(r)
+
+        if len(self.day_pen) > BATCH_MEMO_SIZE:
+            self.day_pen.clear()
+        if len(self.driver_pen) > BATCH_MEMO_SIZE:
+            self.driver_pen.clear()
+        p_bus = 0
+        for lo, hi in self.day_bounds:
+            if 1 in mask[lo:hi]:
+                p_bus += self.day_penalty(lo, hi, mask)
+        p_driver = 0
+        for (code, _), ranks in drivers.items():
+            p_driver += self.driver_penalty(code, ranks)
+
+        extra_buses = max(0, max_bus - BASE_BUSES)
+        penalties = p_driver + p_bus + p_shift + extra_buses*PENALTY_TOO_MANY_BUSES
+        return fitness_value(R, len(drivers), peak_count, penalties, len(self.ranks))
+
+def score_encoded(t_col, d_col, b_col, index):
+    """
+    Фитнес одного индивидуума по столбцам хромосомы (types, ids, buses)
+    без декодирования расписания (см. BatchScorer).
+    """
+    return BatchScorer(index).score(t_col, d_col, b_col)
+
+def fitness_batch(population, index=None):
+    """
+    Пакетный расчёт фитнеса для всей популяции одним BatchScorer:
+    совпадающие у особей дни и графики водителей оцениваются один раз.
+    Возвращает список значений фитнеса в порядке population
+    (совпадает с [fitness(ind) for ind in population]).
+    """
+    if index is None:
+        index = default_index()
+    scorer = BatchScorer(index)
+    return [scorer.score(ind.types, ind.ids, ind.buses) for ind in population]
+
+# ПАРАЛЛЕЛЬНАЯ ОЦЕНКА ПОПУЛЯЦИИ
+_pool_index = None    # Индекс рейсов, наследуемый процессами пула при fork
+_worker_index = None  # Индекс рейсов внутри процесса пула
+
+def pack_population(population):
+    """
+    Компактная упаковка популяции для передачи в процессы пула:
+    на индивидуума - bytes из столбцов хромосомы [types | ids | buses].
+    """
+    return [(ind.types + ind.ids + ind.buses).tobytes() for ind in population]
+
+def _init_worker(index=None):
+    """
+    Инициализация процесса пула: индекс рейсов передаётся один раз на процесс.
+    """
+    global _worker_index
+    _worker_index = index if index is not None else _pool_index
+
+def _score_packed(chunk):
+    """
+    Фитнес пачки упакованных индивидуумов (выполняется в процессе пула).
+    """
+    index = _worker_index
+    n = len(index)
+    scorer = BatchScorer(index)
+    result = []
+    for data in chunk:
+        arr = array('h')
+        arr.frombytes(data)
+        result.append(scorer.score(arr[:n], arr[n:2*n], arr[2*n:]))
+    return result
+
+def make_pool(workers, index=None):
+    """
+    Пул процессов для fitness_parallel.
+    При fork индекс рейсов наследуется процессами без сериализации,
+    иначе передаётся один раз на процесс через initializer.
+    """
+    # Импорт здесь, а не в начале модуля: он нужен только при создании пула
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    global _pool_index
+    if index is None:
+        index = default_index()
+    if 'fork' in multiprocessing.get_all_start_methods():
+        _pool_index = index
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_init_worker)
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker, initargs=(index,))
+
+def fitness_parallel(population, pool, workers):
+    """
+    Фитнес популяции в пуле процессов: популяция делится на workers
+    непрерывных частей, результаты собираются в исходном порядке,
+    поэтому не зависят от числа процессов.
+    """
+    packed = pack_population(population)
+    size = max(1, -(-len(packed) // workers))
+    chunks = [packed[k:k+size] for k in range(0, len(packed), size)]
+    result = []
+    for part in pool.map(_score_packed, chunks):
+        result.extend(part)
+    return result
+
+# КЭШ ФИТНЕСА
+FITNESS_CACHE_SIZE = 10000  # Сколько последних оценок хранит FitnessCache
+
+class FitnessCache:
+    """
+    Ограниченный LRU-кэш фитнеса: ключ - хэш содержимого хромосомы
+    (Chromosome.digest, 16 байт независимо от числа рейсов),
+    при переполнении вытесняется давно не использованная запись.
+    hits / misses - счётчики попаданий и промахов; повтор особи внутри одной
+    популяции считается попаданием, так что hits + misses = числу оценок.
+    """
+    def __init__(self, maxsize=FITNESS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, population, score):
+        """
+        Фитнес популяции: найденные в кэше значения берутся из него,
+        остальные считаются одним вызовом score(список индивидуумов)
+        (пакетно или в пуле процессов) и добавляются в кэш.
+        """
+        fits = [None]*len(population)
+        missing = {}
+        for k, ind in enumerate(population):
+            key = ind.digest()
+            fit = self.entries.get(key)
+            if fit is not None:
+                self.entries.move_to_end(key)
+                fits[k] = fit
+                self.hits += 1
+            else:
+                # Дубликаты внутри одной популяции считаются один раз
+                missing.setdefault(key, []).append(k)
+        self.misses += len(missing)
+        self.hits += sum(len(positions) - 1 for positions in missing.values())
+        if missing:
+            keys = list(missing)
+            for key, fit in zip(keys, score([population[missing[key][0]] for key in keys])):
+                for k in missing[key]:
+                    fits[k] = fit
+                self.entries[key] = fit
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return fits
+
+# ИНКРЕМЕНТАЛЬНАЯ ОЦЕНКА ФИТНЕСА
+DELTA_MAX_FRACTION = 0.25  # Доля изменённых генов, выше которой выгоднее полный пересчёт
+
+class FitnessState:
+    """
+    Кэш вкладов в фитнес одного индивидуума для инкрементального пересчёта:
+      - drivers / driver_pen: рейсы водителя и его суммарный штраф
+      - buses: рейсы каждого автобуса (штраф пересменки ведётся по соседним парам)
+      - loads: поминутная загрузка автобусов каждого дня (см. bus_load_update)
+    Рейсы хранятся как ранги в хронологическом порядке index.order.
+    """
+    def __init__(self, ind, index):
+        n = len(index)
+        self.ind = ind
+        self.index = index
+        self.t_col = [0]*n
+        self.d_col = [0]*n
+        self.b_col = [0]*n
+        self.R = 0
+        self.peak_count = 0
+        self.drivers = {}
+        self.driver_pen = {}
+        self.buses = {}
+        self.loads = {}
+        self.p_driver = 0
+        self.p_shift = 0
+        self.p_bus = 0
+        self.fitness = 0
+
+    def copy(self, ind):
+        """
+        Поверхностная копия для потомка: вложенные списки копируются
+        только при изменении (см. fitness_delta).
+        """
+        child = FitnessState.__new__(FitnessState)
+        child.__dict__.update(self.__dict__)
+        child.ind = ind
+        child.t_col = self.t_col[:]
+        child.d_col = self.d_col[:]
+        child.b_col = self.b_col[:]
+        child.drivers = dict(self.drivers)
+        child.driver_pen = dict(self.driver_pen)
+        child.buses = dict(self.buses)
+        child.loads = dict(self.loads)
+        return child
+
+    def shift_pair(self, ra, rb):
+        """
+        Штраф пересменки между соседними рейсами ra -> rb одного автобуса.
+        """
+        index = self.index
+        ia, ib = index.order[ra], index.order[rb]
+        if ((self.t_col[ia], self.d_col[ia]) != (self.t_col[ib], self.d_col[ib])
+                and index.starts[ib] - index.ends[ia] < 10):
+            return PENALTY_SHIFT_CHANGE
+        return 0
+
+def fitness_state(ind, index=None):
+    """
+    Полная оценка индивидуума с построением FitnessState
+    (отправная точка для fitness_delta).
+    """
+    if index is None:
+        index = default_index()
+    empty = FitnessState(Chromosome.empty(len(index)), index)
+    # Вставка в хронологическом порядке - каждый рейс добавляется в конец своих списков
+    return fitness_delta(empty, index.order, ind)
+
+def fitness_delta(parent_state, changed_indices, child=None):
+    """
+    Инкрементальный фитнес потомка.
+    parent_state - FitnessState родителя, changed_indices - позиции изменённых генов,
+    child - хромосома потомка (по умолчанию parent_state.ind, изменённая на месте).
+    Пересчитываются только водители и автобусы, затронутые изменёнными генами,
+    а загрузка дня - лишь в окнах изменённых рейсов.
+    Возвращает новый FitnessState; состояние родителя не меняется.
+    """
+    if child is None:
+        child = parent_state.ind
+    return _apply_delta(parent_state.copy(child), changed_indices)
+
+def _apply_delta(st, changed_indices):
+    """
+    Пересчёт FitnessState st на месте под изменённые гены st.ind.
+    Вложенные списки копируются перед записью, поэтому состояния,
+    с которыми st делит их после copy(), не меняются.
+    """
+    child = st.ind
+    index = st.index
+    days, peaks, order, rank = index.days, index.peaks, index.order, index.rank
+    starts, ends = index.starts, index.ends
+    owned = set()
+    touched_drivers = set()
+
+    def day_load(old):
+        return array('h', old) if old else array('h', [0])*TOTAL_TIME
+
+    def own(container, key, make):
+        # Копирование вложенного контейнера при первой записи в него
+        if (id(container), key) not in owned or key not in container:
+            container[key] = make(container.get(key, ()))
+            owned.add((id(container), key))
+        return container[key]
+
+    changed = []
+    for i in changed_indices:
+        code, b = child.types[i], child.buses[i]
+        new = (code, child.ids[i], b) if code and b else (0, 0, 0)
+        if new != (st.t_col[i], st.d_col[i], st.b_col[i]):
+            changed.append((i, new))
+
+    # 1) Снимаем старые назначения
+    for i, new in changed:
+        code = st.t_col[i]
+        if not code:
+            continue
+        r = rank[i]
+        key = (code, st.d_col[i])
+        day = days[i]
+        st.R -= 1
+        if peaks[i]:
+            st.peak_count -= 1
+        drv = own(st.drivers, key, list)
+        del drv[bisect.bisect_left(drv, r)]
+        touched_drivers.add(key)
+        start_i = max(starts[i] - START_TIME, 0)
+        end_i   = min(ends[i] - START_TIME, TOTAL_TIME)
+        if start_i < end_i:
+            st.p_bus += bus_load_update(own(st.loads, day, day_load), start_i, end_i, -1)
+
+        lst = own(st.buses, st.b_col[i], list)
+        pos = bisect.bisect_left(lst, r)
+        prev = lst[pos-1] if pos > 0 else None
+        nxt = lst[pos+1] if pos+1 < len(lst) else None
+        if prev is not None:
+            st.p_shift -= st.shift_pair(prev, r)
+        if nxt is not None:
+            st.p_shift -= st.shift_pair(r, nxt)
+        if prev is not None and nxt is not None:
+            st.p_shift += st.shift_pair(prev, nxt)
+        del lst[pos]
+        if not lst:
+            del st.buses[st.b_col[i]]
+        st.t_col[i] = st.d_col[i] = st.b_col[i] = 0
+
+    # 2) Добавляем новые назначения
+    for i, new in changed:
+        code, did, b = new
+        st.t_col[i], st.d_col[i], st.b_col[i] = new
+        if not code:
+            continue
+        r = rank[i]
+        key = (code, did)
+        day = days[i]
+        st.R += 1
+        if peaks[i]:
+            st.peak_count += 1
+        bisect.insort(own(st.drivers, key, list), r)
+        touched_drivers.add(key)
+        start_i = max(starts[i] - START_TIME, 0)
+        end_i   = min(ends[i] - START_TIME, TOTAL_TIME)
+        if start_i < end_i:
+            st.p_bus += bus_load_update(own(st.loads, day, day_load), start_i, end_i, 1)
+
+        lst = own(st.buses, b, list)
+        pos = bisect.bisect_left(lst, r)
+        prev = lst[pos-1] if pos > 0 else None
+        nxt = lst[pos] if pos < len(lst) else None
+        if prev is not None and nxt is not None:
+            st.p_shift -= st.shift_pair(prev, nxt)
+        if prev is not None:
+            st.p_shift += st.shift_pair(prev, r)
+        if nxt is not None:
+            st.p_shift += st.shift_pair(r, nxt)
+        lst.insert(pos, r)
+
+    # 3) Пересчитываем штрафы затронутых водителей
+    for key in touched_drivers:
+        st.p_driver -= st.driver_pen.pop(key, 0)
+        ranks = st.drivers.get(key)
+        if not ranks:
+            st.drivers.pop(key, None)
+            continue
+        pen = sum(driver_timeline_penalties(DRIVER_TYPES[key[0]], [order[r] for r in ranks], index))
+        st.driver_pen[key] = pen
+        st.p_driver += pen
+
+    max_bus = max(st.buses) if st.buses else 0
+    extra_buses = max(0, max_bus - BASE_BUSES)
+    penalties = st.p_driver + st.p_bus + st.p_shift + extra_buses*PENALTY_TOO_MANY_BUSES
+    st.fitness = fitness_value(st.R, len(st.drivers), st.peak_count, penalties, len(index))
+    return st
+
+def changed_genes(base, child):
+    """
+    Позиции генов, которыми хромосома child отличается от base.
+    Совпадающие столбцы целиком отсекаются сравнением массивов.
+    """
+    changed = set()
+    for col_base, col_child in ((base.types, child.types), (base.ids, child.ids),
+                                (base.buses, child.buses)):
+        if col_base != col_child:
+            changed.update(i for i, (x, y) in enumerate(zip(col_base, col_child)) if x != y)
+    return sorted(changed)
+
+def offspring_state(parent_states, child):
+    """
+    FitnessState потомка: дельта от ближайшего из родителей
+    или полный пересчёт, если изменилось больше DELTA_MAX_FRACTION генов.
+    """
+    best_state, best_changed = None, None
+    for st in parent_states:
+        changed = changed_genes(st.ind, child)
+        if best_changed is None or len(changed) < len(best_changed):
+            best_state, best_changed = st, changed
+    if len(best_changed) > DELTA_MAX_FRACTION*len(child):
+        return fitness_state(child, best_state.index)
+    return fitness_delta(best_state, best_changed, child)
+
+# ЛОКАЛЬНЫЙ ПОИСК (МЕМЕТИЧЕСКИЙ ЭТАП)
+LOCAL_SEARCH_EVALS = 200  # Бюджет пробных ходов локального поиска на одного индивидуума
+SWAP_WINDOW        = 3    # Сколько соседних по времени рейсов пробуем для обмена водителями
+
+def problem_trips(st):
+    """
+    Индексы назначенных рейсов, вносящих штрафы, по состоянию st:
+    рейсы на автобусах сверх BASE_BUSES, рейсы с пересменкой <10 мин,
+    затем рейсы водителей со штрафами.
+    """
+    found = []
+    for b, ranks in st.buses.items():
+        if b > BASE_BUSES:
+            found.extend(ranks)
+        else:
+            for ra, rb in zip(ranks, ranks[1:]):
+                if st.shift_pair(ra, rb):
+                    found.append(rb)
+                    found.append(ra)
+    for key, pen in st.driver_pen.items():
+        if pen:
+            found.extend(st.drivers[key])
+    order = st.index.order
+    return [order[r] for r in dict.fromkeys(found)]
+
+def candidate_moves(st, i, trips=None, forbidden=None):
+    """
+    Целевые ходы для рейса i - списки новых генов [(позиция, тип, ID, автобус)]:
+      - пересадка на другой автобус из BASE_BUSES (пересменка, лишние автобусы);
+      - передача рейса другому уже занятому водителю;
+      - обмен водителями с соседним по времени рейсом того же дня
+        (освобождает окно под обед или длинный перерыв);
+      - снятие рейса.
+    trips - множество позиций, которые разрешено менять (None - все);
+    forbidden(code, did, b) - True для запрещённых назначений.
+    """
+    ind, index = st.ind, st.index
+    code, did, b = ind.types[i], ind.ids[i], ind.buses[i]
+    moves = [[(i, code, did, nb)] for nb in range(1, BASE_BUSES + 1) if nb != b]
+    moves += [[(i, c, d, b)] for (c, d) in st.drivers if (c, d) != (code, did)]
+    r = index.rank[i]
+    lo, hi = index.day_ranges[index.days[i]]
+    for r2 in range(max(lo, r - SWAP_WINDOW), min(hi, r + SWAP_WINDOW + 1)):
+        j = index.order[r2]
+        if j != i and ind.types[j] and ind.buses[j] and (ind.types[j], ind.ids[j]) != (code, did):
+            moves.append([(i, ind.types[j], ind.ids[j], b), (j, code, did, ind.buses[j])])
+    moves.append([(i, 0, 0, 0)])
+    if trips is not None or forbidden is not None:
+        moves = [move for move in moves if _move_allowed(move, trips, forbidden)]
+    return moves
+
+def _move_allowed(move, trips, forbidden):
+    for j, code, did, b in move:
+        if trips is not None and j not in trips:
+            return False
+        if forbidden is not None and code and forbidden(code, did, b):
+            return False
+    return True
+
+def _set_genes(st, genes):
+    """
+    Записывает гены в st.ind и пересчитывает st на месте.
+    Возвращает прежние значения этих генов (для отката).
+    """
+    ind = st.ind
+    old = [(j, ind.types[j], ind.ids[j], ind.buses[j]) for j, _, _, _ in genes]
+    for j, code, did, b in genes:
+        ind.types[j], ind.ids[j], ind.buses[j] = code, did, b
+    _apply_delta(st, [j for j, _, _, _ in genes])
+    return old
+
+def relieve_top_bus(st, max_evals, trips=None, forbidden=None, deadline=None):
+    """
+    Составной ход против штрафа за лишние автобусы: все рейсы автобуса
+    с наибольшим номером (если он больше BASE_BUSES) по одному пересаживаются
+    на лучший автобус с меньшим номером. По отдельности такие пересадки
+    фитнес не улучшают, поэтому ход принимается или откатывается целиком.
+    deadline (time.perf_counter()) проверяется перед каждым пробным пересчётом.
+    Возвращает (принят ли ход, число пробных пересчётов).
+    """
+    top = max(st.buses, default=0)
+    if top <= BASE_BUSES:
+        return False, 0
+    ind, order = st.ind, st.index.order
+    if trips is not None and any(order[r] not in trips for r in st.buses[top]):
+        return False, 0
+    base_fit = st.fitness
+    applied = []
+    evals = 0
+    for r in list(st.buses[top]):
+        i = order[r]
+        code, did = ind.types[i], ind.ids[i]
+        best_fit, best_bus = None, None
+        for nb in range(1, top):
+            if evals >= max_evals or (deadline is not None and time.perf_counter() >= deadline):
+                break
+            if forbidden is not None and forbidden(code, did, nb):
+                continue
+            evals += 1
+            undo = _set_genes(st, [(i, code, did, nb)])
+            if best_fit is None or st.fitness > best_fit:
+                best_fit, best_bus = st.fitness, nb
+            _set_genes(st, undo)
+        if best_bus is None:
+            break
+        applied.append(_set_genes(st, [(i, code, did, best_bus)]))
+    if st.fitness > base_fit:
+        return True, evals
+    for undo in reversed(applied):
+        _set_genes(st, undo)
+    return False, evals
+
+def local_search(state, max_evals=LOCAL_SEARCH_EVALS, trips=None, forbidden=None,
+                 deadline=None):
+    """
+    Меметический этап: составной ход relieve_top_bus и целевые ходы
+    (candidate_moves) для рейсов из problem_trips; для каждого рейса
+    принимается лучший улучшающий фитнес ход.
+    Каждый пробный ход пересчитывается на месте через _apply_delta и откатывается,
+    то есть стоит O(затронутых рейсов), а не полной оценки.
+    trips/forbidden ограничивают ходы (см. candidate_moves),
+    deadline - момент time.perf_counter(), после которого поиск прекращается
+    (проверяется перед каждым пробным ходом).
+    Работает с копией: возвращает FitnessState улучшенной копии state.ind.
+    """
+    st = state.copy(state.ind.copy())
+    ind = st.ind
+    evals = 0
+    improved = True
+
+    def expired():
+        return deadline is not None and time.perf_counter() >= deadline
+
+    while improved and evals < max_evals and not expired():
+        improved, spent = relieve_top_bus(st, max_evals - evals, trips, forbidden, deadline)
+        evals += spent
+        for i in problem_trips(st):
+            if not (ind.types[i] and ind.buses[i]) or (trips is not None and i not in trips):
+                continue
+            base_fit = st.fitness
+            best_fit, best_move = base_fit, None
+            for move in candidate_moves(st, i, trips, forbidden):
+                if evals >= max_evals or expired():
+                    break
+                evals += 1
+                undo = _set_genes(st, move)
+                if st.fitness > best_fit:
+                    best_fit, best_move = st.fitness, move
+                _set_genes(st, undo)
+            if best_move is not None:
+                _set_genes(st, best_move)
+                improved = True
+            if evals >= max_evals or expired():
+                return st
+    return st
+
 # ОПЕРАЦИИ ГЕНЕТИЧЕСКОГО АЛГОРИТМА
-def crossover(p1, p2):
+def crossover(p1, p2, prob=None):
     """
     Одноточечный кроссовер: обмениваемся частью генов между двумя родителями.
+    prob - вероятность кроссовера (по умолчанию CROSSOVER_PROB).
     """
-    if random.random() > CROSSOVER_PROB:
-        return p1[:], p2[:]
+    if prob is None:
+        prob = CROSSOVER_PROB
+    if random.random() > prob:
+        return p1.copy(), p2.copy()
     point = random.randint(1, len(p1)-1)
-    c1 = p1[:point] + p2[point:]
-    c2 = p2[:point] + p1[point:]
+    c1 = Chromosome(p1.types[:point] + p2.types[point:],
+                    p1.ids[:point] + p2.ids[point:],
+                    p1.buses[:point] + p2.buses[point:])
+    c2 = Chromosome(p2.types[:point] + p1.types[point:],
+                    p2.ids[:point] + p1.ids[point:],
+                    p2.buses[:point] + p1.buses[point:])
     return c1, c2
 
-def mutate(ind):
+def mutate(ind, prob=None):
     """
     Мутация: с вероятностью MUTATION_PROB меняем либо водителя, либо автобус, либо сбрасываем назначение.
+    prob - вероятность мутации гена (по умолчанию MUTATION_PROB).
     """
+    if prob is None:
+        prob = MUTATION_PROB
     for i in range(len(ind)):
-        if random.random() < MUTATION_PROB:
-            trip_id, dt, did, b = ind[i]
+        if random.random() < prob:
+            dt, did, b = ind.gene(i)
             if random.random() < 0.3:
                 # Иногда сбрасываем назначение или назначаем новое
                 if dt is None:
                     new_dt, new_did = random_driver_assignment()
                     new_b = random_bus_assignment()
-                    ind[i] = (trip_id, new_dt, new_did, new_b)
+                    ind.set_gene(i, new_dt, new_did, new_b)
                 else:
-                    ind[i] = (trip_id, None, None, None)
+                    ind.set_gene(i, None, None, None)
             else:
                 # Меняем водителя или автобус
                 if dt is not None:
                     # 50%: меняем водителя, 50%: меняем автобус
                     if random.random() < 0.5:
                         new_dt, new_did = random_driver_assignment()
-                        ind[i] = (trip_id, new_dt, new_did, b)
+                        ind.set_gene(i, new_dt, new_did, b)
                     else:
                         new_b = random_bus_assignment()
-                        ind[i] = (trip_id, dt, did, new_b)
+                        ind.set_gene(i, dt, did, new_b)
                 else:
                     new_dt, new_did = random_driver_assignment()
                     new_b = random_bus_assignment()
-                    ind[i] = (trip_id, new_dt, new_did, new_b)
+                    ind.set_gene(i, new_dt, new_did, new_b)
     return ind
 
 def selection(pop):
     """
-    Турнирная селекция: случайно берём k=5 особей и выбираем лучшую из них.
+    Турнирная селекция: случайно берём k=TOURNAMENT_SIZE особей и выбираем лучшую из них.
     pop - список кортежей (fitness_value, individual).
     """
-    k = 5
-    candidates = random.sample(pop, k)
-    candidates.sort(key=lambda x: x[0], reverse=True)
-    return candidates[0][1]
+    return max(random.sample(pop, TOURNAMENT_SIZE), key=lambda x: x[0])[1]
+
+# СЕЛЕКЦИЯ ПО МАССИВУ ФИТНЕСОВ
+SELECTION_SCHEMES = ('tournament', 'rank', 'sus')
+
+def top_k(fits, k):
+    """
+    Индексы k лучших значений fits по убыванию (куча за O(n log k)
+    вместо полной сортировки); при равном фитнесе - в порядке позиций.
+    """
+    return heapq.nlargest(k, range(len(fits)), key=fits.__getitem__)
+
+def tournament_indices(fits, count, k=TOURNAMENT_SIZE):
+    """
+    count турниров по k особей: индекс лучшей в каждом.
+    Все count*k участников выбираются одним вызовом random.choices (с возвращением,
+    в отличие от selection; на больших популяциях разница пренебрежимо мала).
+    """
+    candidates = random.choices(range(len(fits)), k=count*k)
+    key = fits.__getitem__
+    return [max(candidates[j:j + k], key=key) for j in range(0, count*k, k)]
+
+def rank_indices(fits, count):
+    """
+    Ранговая селекция: вероятность выбора пропорциональна рангу особи
+    (худшая - 1, лучшая - n), не зависит от масштаба фитнеса.
+    """
+    order = sorted(range(len(fits)), key=fits.__getitem__)
+    n = len(order)
+    return random.choices(order, cum_weights=[r*(r + 1)//2 for r in range(1, n + 1)], k=count)
+
+def sus_indices(fits, count):
+    """
+    Стохастическая универсальная выборка (SUS): count равноотстоящих указателей
+    с одним случайным сдвигом по колесу рулетки, пропорциональному фитнесу
+    (отрицательные значения сдвигаются к нулю). Порядок выбранных перемешивается,
+    чтобы пары родителей были случайными.
+    """
+    low = min(fits)
+    weights = [f - low for f in fits] if low < 0 else fits
+    total = sum(weights)
+    if total <= 0:
+        return random.choices(range(len(fits)), k=count)
+    step = total / count
+    pointer = random.uniform(0, step)
+    chosen = []
+    acc = 0.0
+    for i, w in enumerate(weights):
+        acc += w
+        while pointer < acc and len(chosen) < count:
+            chosen.append(i)
+            pointer += step
+    while len(chosen) < count:  # погрешность суммы с плавающей точкой
+        chosen.append(len(fits) - 1)
+    random.shuffle(chosen)
+    return chosen
+
+def select_parents(fits, count, scheme='tournament'):
+    """
+    Индексы count родителей следующего поколения за один вызов
+    по схеме scheme из SELECTION_SCHEMES.
+    """
+    if scheme == 'tournament':
+        return tournament_indices(fits, count)
+    if scheme == 'rank':
+        return rank_indices(fits, count)
+    if scheme == 'sus':
+        return sus_indices(fits, count)
+    raise ValueError(f"Неизвестная схема селекции: {scheme}")
+
+def penalty_breakdown(ind, index=None):
+    """
+    Штрафы индивидуума по видам:
+    driver (графики водителей; по правилам - driver_rules), bus (загрузка автобусов),
+    shift (пересменки), extra_buses (автобусы сверх BASE_BUSES).
+    """
+    if index is None:
+        index = default_index()
+    schedule = decode_individual(ind)
+    driver_rules = driver_penalty_breakdown(schedule, index)
+    return {
+        'driver':      sum(driver_rules.values()),
+        'driver_rules': driver_rules,
+        'bus':         check_bus_constraints(schedule, index=index),
+        'shift':       check_shift_change(schedule, index),
+        'extra_buses': count_buses_used(schedule) * PENALTY_TOO_MANY_BUSES,
+    }
+
+# КОНТРОЛЬНЫЕ ТОЧКИ ГА
+CHECKPOINT_VERSION = 1
 
-def genetic_algorithm():
+def save_checkpoint(path, generation, population, best_ind, best_fit, rng_state):
+    """
+    Записываем контрольную точку ГА: популяция и лучший индивидуум
+    упакованы в bytes (столбцы хромосом), плюс состояние генератора random.
+    Запись атомарная: сначала во временный файл, затем os.replace.
+    """
+    data = {
+        'version':     CHECKPOINT_VERSION,
+        'generation':  generation,
+        'n_trips':     len(best_ind),
+        'population':  b''.join(pack_population(population)),
+        'best':        pack_population([best_ind])[0],
+        'best_fitness': best_fit,
+        'rng_state':   rng_state,
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def unpack_chromosome(data, n):
+    """
+    Обратная операция к pack_population для одного индивидуума из n рейсов.
+    """
+    arr = array('h')
+    arr.frombytes(data)
+    return Chromosome(arr[:n], arr[n:2*n], arr[2*n:])
+
+def load_checkpoint(path):
+    """
+    Читаем контрольную точку, записанную save_checkpoint.
+    Возвращает словарь с ключами generation, population, best, best_fitness, rng_state.
+    """
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    if data.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия контрольной точки: {data.get('version')}")
+    n = data['n_trips']
+    size = 3*n*array('h').itemsize
+    blob = data['population']
+    data['population'] = [unpack_chromosome(blob[k:k+size], n) for k in range(0, len(blob), size)]
+    data['best'] = unpack_chromosome(data['best'], n)
+    return data
+
+# ПРОФИЛИРОВАНИЕ
+# Функции, время и число вызовов которых учитывает Profiler.instrument()
+PROFILED_FUNCTIONS = ('fitness_batch', 'score_encoded', 'fitness_state', 'fitness_delta',
+                      '_apply_delta', 'offspring_state', 'driver_timeline_penalties',
+                      'bus_load_penalty', 'decode_individual', 'check_driver_constraints',
+                      'check_bus_constraints', 'check_shift_change', 'driver_penalty_breakdown',
+                      'penalty_breakdown', 'fitness', 'local_search', 'crossover', 'mutate',
+                      'selection', 'select_parents', 'top_k')
+
+class Profiler:
+    """
+    Счётчики времени и вызовов по стадиям решателя и штрафы лучшего по поколениям.
+      - stages: имя -> [число вызовов, суммарное время в секундах]
+        (время вложенных вызовов входит во время внешних);
+      - generations: по записи на поколение (см. record_generation).
+    Без профилировщика код решателя не меняется, поэтому выключенное
+    профилирование ничего не стоит: функции из PROFILED_FUNCTIONS
+    оборачиваются только внутри instrument(). Вызовы в процессах пула
+    (workers) не учитываются - там видна только стадия 'evaluate'.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.generations = []
+
+    def add(self, name, elapsed, calls=1):
+        stage = self.stages.setdefault(name, [0, 0.0])
+        stage[0] += calls
+        stage[1] += elapsed
+
+    def wrap(self, func, name=None):
+        """
+        func с учётом времени и числа вызовов в стадии name (по умолчанию - имя функции).
+        """
+        name = name or func.__name__
+        stage = self.stages.setdefault(name, [0, 0.0])
+        perf_counter = time.perf_counter
+
+        def timed(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage[0] += 1
+                stage[1] += perf_counter() - t0
+        timed.__wrapped__ = func
+        return timed
+
+    @contextmanager
+    def instrument(self, names=PROFILED_FUNCTIONS):
+        """
+        На время блока заменяет функции модуля names обёртками wrap
+        (вызовы изнутри модуля идут через глобальные имена и тоже учитываются).
+        """
+        module = globals()
+        saved = {name: module[name] for name in names}
+        module.update((name, self.wrap(func, name)) for name, func in saved.items())
+        try:
+            yield self
+        finally:
+            module.update(saved)
+
+    def record_generation(self, stats, elapsed, evaluate_time):
+        """
+        Запись поколения: номер, время смены поколения и оценки фитнеса,
+        лучший и средний фитнес, штрафы лучшего по видам и по правилам водителей.
+        """
+        penalties = stats['penalties']
+        record = {'generation': stats['generation'], 'time': elapsed,
+                  'evaluate_time': evaluate_time, 'best': stats['best'], 'mean': stats['mean']}
+        record.update((key, value) for key, value in penalties.items() if key != 'driver_rules')
+        record.update(penalties['driver_rules'])
+        self.generations.append(record)
+
+    def summary(self):
+        """
+        Структурированная статистика: стадии (calls, time, mean) и записи поколений.
+        """
+        return {
+            'stages': {name: {'calls': calls, 'time': total,
+                              'mean': total / calls if calls else 0.0}
+                       for name, (calls, total) in self.stages.items()},
+            'generations': self.generations,
+        }
+
+    def to_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def to_csv(self, stages_path, generations_path=None):
+        """
+        Стадии - в stages_path (stage, calls, time, mean),
+        записи поколений - в generations_path (если задан).
+        """
+        with open(stages_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['stage', 'calls', 'time', 'mean'])
+            for name, stage in self.summary()['stages'].items():
+                writer.writerow([name, stage['calls'], stage['time'], stage['mean']])
+        if generations_path is not None and self.generations:
+            with open(generations_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=list(self.generations[0]))
+                writer.writeheader()
+                writer.writerows(self.generations)
+
+# ОСНОВНОЙ ЦИКЛ ГА
+SEED_MUTATION_PROB = 0.05  # Вероятность мутации гена у копий жадного расписания
+
+def seed_population(count, index=None, base=None):
+    """
+    count особей на основе жадного расписания (или готового расписания base,
+    например загруженного load_schedule): первая - оно само,
+    остальные - его копии с мутацией SEED_MUTATION_PROB для разнообразия.
+    """
+    if count <= 0:
+        return []
+    if base is None:
+        base = greedy_algorithm(index)
+    return [base] + [mutate(base.copy(), SEED_MUTATION_PROB) for _ in range(count - 1)]
+
+STOP_REASONS = {
+    'generations': "исчерпан бюджет поколений",
+    'stall':       "нет улучшения лучшего фитнеса",
+    'time_budget': "исчерпан бюджет времени",
+}
+
+def iter_genetic_algorithm(incremental=False, workers=None, index=None,
+                           checkpoint_path=None, checkpoint_every=50, resume_from=None,
+                           stall_generations=None, min_improvement=0.0, time_budget=None,
+                           adaptive=False, cache_size=FITNESS_CACHE_SIZE, seed_fraction=0.0,
+                           population=None, generations=None, selection_scheme='tournament',
+                           profiler=None, memetic=0, memetic_evals=LOCAL_SEARCH_EVALS):
+    """
+    Генератор основного цикла ГА: после каждой смены поколения выдаёт словарь
+    статистики (generation, best, mean, penalties - штрафы лучшего по видам,
+    best_so_far, best_individual, diversity, mutation_prob, crossover_prob,
+    cache_hits, cache_misses, stop_reason, population - текущая популяция).
+    Вызывающий код может остановить запуск, просто прекратив итерацию.
+    incremental=True - потомки оцениваются через fitness_delta от родителя
+    вместо пакетного пересчёта всей популяции.
+    workers=N (N > 1) - фитнес считается в пуле из N процессов (fitness_parallel).
+    index - TripIndex набора рейсов (по умолчанию default_index()).
+    checkpoint_path - файл контрольной точки, записывается каждые checkpoint_every
+    поколений и в конце; resume_from - продолжить запуск с контрольной точки.
+    Критерии остановки (причина - в stop_reason последней статистики):
+      - 'generations': исчерпан бюджет generations (по умолчанию GENERATIONS);
+      - 'stall': best_so_far не вырос больше чем на min_improvement
+        за stall_generations поколений подряд;
+      - 'time_budget': прошло time_budget секунд с начала запуска.
+    adaptive=True - вероятности мутации и кроссовера подстраиваются
+    под разнообразие популяции (adaptive_probs); без adaptive разнообразие
+    не считается и diversity в статистике - None.
+    Счётчик стагнации и бюджет времени отсчитываются заново при resume_from.
+    cache_size - размер LRU-кэша фитнеса для пакетной и параллельной оценки
+    (0 - без кэша; в режиме incremental не используется).
+    seed_fraction - доля начальной популяции, построенная из greedy_algorithm
+    (первая особь - само жадное расписание, остальные - его мутации).
+    population - готовая начальная популяция вместо случайной; размер популяции
+    в поколениях равен её длине (иначе - POP_SIZE).
+    selection_scheme - схема выбора родителей (select_parents): 'tournament',
+    'rank' или 'sus'.
+    memetic=K - каждое поколение K лучших особей заменяются их улучшенными
+    локальным поиском копиями (local_search, до memetic_evals пробных ходов на особь).
+    profiler - Profiler: на время работы каждого поколения (но не между yield)
+    функции из PROFILED_FUNCTIONS учитываются им, оценка фитнеса - стадией 'evaluate', смена поколения -
+    стадией 'generation', а по каждому поколению пишется record_generation.
+    """
+    if incremental and workers:
+        raise ValueError("incremental и workers нельзя использовать одновременно")
+    if selection_scheme not in SELECTION_SCHEMES:
+        raise ValueError(f"Неизвестная схема селекции: {selection_scheme}")
+    if index is None:
+        index = default_index()
+    pool = make_pool(workers, index) if workers and workers > 1 else None
+    try:
+        yield from _run_genetic_algorithm(
+            pool=pool, workers=workers, index=index, incremental=incremental,
+            checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every,
+            resume_from=resume_from, stall_generations=stall_generations,
+            min_improvement=min_improvement, time_budget=time_budget, adaptive=adaptive,
+            cache_size=cache_size, seed_fraction=seed_fraction, population=population,
+            generations=GENERATIONS if generations is None else generations,
+            selection_scheme=selection_scheme, profiler=profiler,
+            memetic=memetic, memetic_evals=memetic_evals)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def _run_genetic_algorithm(*, pool, workers, index, incremental,
+                           checkpoint_path, checkpoint_every, resume_from,
+                           stall_generations, min_improvement, time_budget, adaptive,
+                           cache_size, seed_fraction, population, generations,
+                           selection_scheme, profiler, memetic, memetic_evals):
+    """
+    Основной цикл ГА (см. iter_genetic_algorithm).
+    """
+    started = time.perf_counter()
+    elite_size = 10  # сколько особей сохраняем в поколениях
+    best_ind, best_fit = None, None
+    start_gen = 0
+    if resume_from is not None:
+        checkpoint = load_checkpoint(resume_from)
+        if len(checkpoint['best']) != len(index):
+            raise ValueError("Контрольная точка записана для другого набора рейсов")
+        population = checkpoint['population']
+        best_ind, best_fit = checkpoint['best'], checkpoint['best_fitness']
+        start_gen = checkpoint['generation']
+        random.setstate(checkpoint['rng_state'])
+    elif population is not None:
+        population = list(population)
+    else:
+        population = seed_population(int(seed_fraction*POP_SIZE), index)
+        population += [init_individual(index) for _ in range(POP_SIZE - len(population))]
+    pop_size = len(population)
+    if pop_size < 2:
+        raise ValueError("В популяции должно быть не меньше двух особей")
+    states = {}
+
+    cache = FitnessCache(cache_size) if cache_size and not incremental else None
+
+    def score(population):
+        if pool is not None:
+            return fitness_parallel(population, pool, workers)
+        return fitness_batch(population, index)
+
+    def evaluate(population):
+        if incremental:
+            # Особи без состояния (начальная популяция) оцениваются полностью
+            for ind in population:
+                if id(ind) not in states:
+                    states[id(ind)] = fitness_state(ind, index)
+            return [states[id(ind)].fitness for ind in population]
+        if cache is not None:
+            return cache.evaluate(population, score)
+        return score(population)
+
+    instrumented = nullcontext
+    if profiler is not None:
+        evaluate = profiler.wrap(evaluate, 'evaluate')
+        evaluate_stage = profiler.stages['evaluate']
+        instrumented = profiler.instrument
+    with instrumented():
+        fits = evaluate(population)
+    reference_fit = best_fit
+    stall = 0
+    mutation_prob, crossover_prob = MUTATION_PROB, CROSSOVER_PROB
+    for gen in range(start_gen, generations):
+        if profiler is not None:
+            gen_started, evaluate_before = time.perf_counter(), evaluate_stage[1]
+        # Функции подменяются профилировщиком только на время работы поколения,
+        # но не между yield
+        with instrumented():
+            # элитизм: сохраняем top-10 (без сортировки всей популяции)
+            elite = top_k(fits, min(elite_size, pop_size - 1))
+            diversity = None
+            if adaptive:
+                diversity = population_diversity(population, population[elite[0]])
+                mutation_prob, crossover_prob = adaptive_probs(diversity)
+            next_population = [population[i] for i in elite]
+            next_states = {id(ind): states[id(ind)] for ind in next_population} if incremental else {}
+
+            # Все родители поколения выбираются одним вызовом, пары - подряд
+            parents = select_parents(fits, 2*((pop_size - len(next_population) + 1)//2),
+                                     selection_scheme)
+            for k in range(0, len(parents), 2):
+                p1, p2 = population[parents[k]], population[parents[k + 1]]
+                c1, c2 = crossover(p1, p2, crossover_prob)
+                c1 = mutate(c1, mutation_prob)
+                c2 = mutate(c2, mutation_prob)
+                children = [c1, c2] if len(next_population) + 1 < pop_size else [c1]
+                for c in children:
+                    next_population.append(c)
+                    if incremental:
+                        next_states[id(c)] = offspring_state((states[id(p1)], states[id(p2)]), c)
+
+            population = next_population
+            if incremental:
+                states = next_states
+            fits = evaluate(population)
+            if memetic:
+                # Меметический этап: лучшие особи заменяются улучшенными копиями
+                population = population[:]
+                for i in top_k(fits, min(memetic, len(population))):
+                    ind = population[i]
+                    st = states[id(ind)] if incremental else fitness_state(ind, index)
+                    st = local_search(st, memetic_evals)
+                    population[i], fits[i] = st.ind, st.fitness
+                    if incremental:
+                        states[id(st.ind)] = st
+
+            best_i = max(range(len(fits)), key=fits.__getitem__)
+            gen_best_fit, gen_best = fits[best_i], population[best_i]
+            if best_fit is None or gen_best_fit > best_fit:
+                best_ind, best_fit = gen_best, gen_best_fit
+
+            # Критерии остановки
+            if reference_fit is None or best_fit - reference_fit > min_improvement:
+                reference_fit = best_fit
+                stall = 0
+            else:
+                stall += 1
+            stop_reason = None
+            if gen + 1 == generations:
+                stop_reason = 'generations'
+            if stall_generations is not None and stall >= stall_generations:
+                stop_reason = 'stall'
+            if time_budget is not None and time.perf_counter() - started >= time_budget:
+                stop_reason = 'time_budget'
+
+            stats = {
+                'generation':  gen,
+                'best':        gen_best_fit,
+                'mean':        sum(fits) / len(fits),
+                'penalties':   penalty_breakdown(gen_best, index),
+                'best_so_far': best_fit,
+                'best_individual': best_ind,
+                'diversity':   diversity,
+                'mutation_prob':  mutation_prob,
+                'crossover_prob': crossover_prob,
+                'cache_hits':   cache.hits if cache is not None else 0,
+                'cache_misses': cache.misses if cache is not None else 0,
+                'stop_reason': stop_reason,
+                'population':  population,
+            }
+            if checkpoint_path is not None and ((gen + 1) % checkpoint_every == 0
+                                                or stop_reason is not None):
+                t0 = time.perf_counter()
+                save_checkpoint(checkpoint_path, gen + 1, population, best_ind, best_fit,
+                                random.getstate())
+                stats['checkpoint_time'] = time.perf_counter() - t0
+        if profiler is not None:
+            elapsed = time.perf_counter() - gen_started
+            profiler.add('generation', elapsed)
+            profiler.record_generation(stats, elapsed, evaluate_stage[1] - evaluate_before)
+        yield stats
+        if stop_reason is not None:
+            return
+
+def population_diversity(population, best):
+    """
+    Разнообразие популяции: средняя доля генов, которыми индивидуумы
+    отличаются от лучшего (0 - популяция сошлась в одну точку).
+    """
+    n = len(best)
+    if n == 0:
+        return 0.0
+    total = 0
+    for ind in population:
+        if ind is best:
+            continue
+        total += sum(1 for i in range(n)
+                     if ind.types[i] != best.types[i] or ind.ids[i] != best.ids[i]
+                     or ind.buses[i] != best.buses[i])
+    return total / (n*len(population))
+
+def adaptive_probs(diversity):
+    """
+    Вероятности (мутации, кроссовера) в зависимости от разнообразия популяции:
+    чем сильнее популяция сошлась, тем чаще мутация и реже кроссовер.
+    """
+    lack = max(0.0, 1.0 - diversity / DIVERSITY_TARGET)
+    mutation_prob = MUTATION_PROB + (ADAPTIVE_MUTATION_MAX - MUTATION_PROB)*lack
+    crossover_prob = CROSSOVER_PROB - (CROSSOVER_PROB - ADAPTIVE_CROSSOVER_MIN)*lack
+    return mutation_prob, crossover_prob
+
+def genetic_algorithm(**kwargs):
     """
     Запуск основного цикла ГА:
     1) Инициализируем популяцию
@@ -422,79 +1998,658 @@ def genetic_algorithm():
     3) Сортируем и берём элитную часть next_population
     4) Делаем кроссовер, мутации до заполнения популяции
     5) Повторяем на протяжении GENERATIONS поколений
+    Параметры - как у iter_genetic_algorithm.
     Возвращаем лучший найденный индивидуум и его фитнес.
     """
-    population = [init_individual() for _ in range(POP_SIZE)]
-    elite_size = 10  # сколько особей сохраняем в поколениях
+    best_ind, best_fit = None, None
+    for stats in iter_genetic_algorithm(**kwargs):
+        best_ind, best_fit = stats['best_individual'], stats['best_so_far']
+        # Периодически выводим прогресс
+        if stats['generation'] % 50 == 0:
+            print(f"Поколение {stats['generation']}, лучший фитнес: {stats['best']:.4f}")
+        if stats['stop_reason'] is not None:
+            print(f"Остановка на поколении {stats['generation']}: {STOP_REASONS[stats['stop_reason']]}")
+    if best_ind is None:
+        # Запуск возобновлён с уже завершённой контрольной точки
+        checkpoint = load_checkpoint(kwargs['resume_from'])
+        best_ind, best_fit = checkpoint['best'], checkpoint['best_fitness']
+    return best_ind, best_fit
 
-    for gen in range(GENERATIONS):
-        scored = [(fitness(ind), ind) for ind in population]
-        scored.sort(key=lambda x: x[0], reverse=True)
-        # элитизм: сохраняем top-10
-        next_population = [scored[i][1] for i in range(min(elite_size, POP_SIZE))]
+# МОДЕЛЬ ОСТРОВОВ
+MIGRATION_TOPOLOGIES = ('ring', 'random')
 
-        while len(next_population) < POP_SIZE:
-            p1 = selection(scored)
-            p2 = selection(scored)
-            c1, c2 = crossover(p1, p2)
-            c1 = mutate(c1)
-            c2 = mutate(c2)
-            next_population.append(c1)
-            if len(next_population) < POP_SIZE:
-                next_population.append(c2)
+def _island_epoch(packed, rng_state, generations, options, index=None):
+    """
+    Эпоха одного острова: generations поколений iter_genetic_algorithm
+    со своим состоянием random (результат не зависит от того, в каком процессе
+    и в каком порядке выполняются острова).
+    packed - упакованная популяция (None - создать начальную).
+    Возвращает (упакованная популяция по убыванию фитнеса, фитнесы,
+    состояние random, средний фитнес последнего поколения).
+    """
+    if index is None:
+        index = _worker_index
+    random.setstate(rng_state)
+    population = None
+    if packed is not None:
+        population = [unpack_chromosome(data, len(index)) for data in packed]
+    stats = None
+    for stats in iter_genetic_algorithm(index=index, population=population,
+                                        generations=generations, **options):
+        pass
+    scored = sorted(zip(fitness_batch(stats['population'], index), stats['population']),
+                    key=lambda x: x[0], reverse=True)
+    return (pack_population([ind for _, ind in scored]), [fit for fit, _ in scored],
+            random.getstate(), stats['mean'])
 
-        population = next_population
+def island_genetic_algorithm(islands=4, migration_interval=25, migrants=2, topology='ring',
+                             processes=None, index=None, seed=None, generations=None,
+                             **options):
+    """
+    Модель островов: islands независимых популяций, каждая эволюционирует
+    в своём процессе (processes, по умолчанию - по процессу на остров;
+    1 - последовательно в текущем процессе) теми же selection/crossover/mutate.
+    Каждые migration_interval поколений migrants лучших особей каждого острова
+    заменяют худших на острове-получателе:
+      - 'ring': остров k -> остров k+1 (по кругу);
+      - 'random': каждому острову - случайный остров-источник.
+    seed - зерно для состояний random островов (по умолчанию берётся из random).
+    options - прочие параметры iter_genetic_algorithm (кроме index, population,
+    generations). Результат при данном seed не зависит от числа процессов.
+    Возвращает (лучший индивидуум, его фитнес, статистика по островам).
+    """
+    if topology not in MIGRATION_TOPOLOGIES:
+        raise ValueError(f"Неизвестная топология миграции: {topology}")
+    if index is None:
+        index = default_index()
+    if generations is None:
+        generations = GENERATIONS
+    if processes is None:
+        processes = islands
+    master = random.Random(random.getrandbits(64) if seed is None else seed)
+    rng_states = [random.Random(master.getrandbits(64)).getstate() for _ in range(islands)]
+    packed = [None]*islands
+    fits = [None]*islands
+    island_stats = [{'island': k, 'best': None, 'mean': None, 'history': []}
+                    for k in range(islands)]
 
-        # Периодически выводим прогресс
-        if gen % 50 == 0:
-            best_fit, best_ind = max(((fitness(i), i) for i in population), key=lambda x: x[0])
-            print(f"Поколение {gen}, лучший фитнес: {best_fit:.4f}")
+    pool = make_pool(processes, index) if processes > 1 else None
+    try:
+        done = 0
+        while done < generations:
+            epoch = min(migration_interval, generations - done)
+            if pool is not None:
+                futures = [pool.submit(_island_epoch, packed[k], rng_states[k], epoch, options)
+                           for k in range(islands)]
+                results = [f.result() for f in futures]
+            else:
+                results = [_island_epoch(packed[k], rng_states[k], epoch, options, index)
+                           for k in range(islands)]
+            done += epoch
+            for k, (packed[k], fits[k], rng_states[k], mean) in enumerate(results):
+                st = island_stats[k]
+                st['best'], st['mean'] = fits[k][0], mean
+                st['history'].append((done, fits[k][0]))
 
-    best_fit, best_ind = max(((fitness(i), i) for i in population), key=lambda x: x[0])
-    return best_ind, best_fit
+            if done < generations and migrants > 0 and islands > 1:
+                # Миграция: лучшие особи источника заменяют худших у получателя
+                if topology == 'ring':
+                    sources = [(k - 1) % islands for k in range(islands)]
+                else:
+                    sources = [master.choice([j for j in range(islands) if j != k])
+                               for k in range(islands)]
+                incoming = [(packed[src][:migrants], fits[src][:migrants]) for src in sources]
+                for k, (mig_packed, mig_fits) in enumerate(incoming):
+                    keep = len(packed[k]) - len(mig_packed)
+                    packed[k] = packed[k][:keep] + mig_packed
+                    fits[k] = fits[k][:keep] + mig_fits
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    best_k = max(range(islands), key=lambda k: fits[k][0])
+    return unpack_chromosome(packed[best_k][0], len(index)), fits[best_k][0], island_stats
+
+# КОНСТРУКТИВНЫЙ (ЖАДНЫЙ) АЛГОРИТМ
+DAY_SPAN = 2*24*60  # Сдвиг "абсолютного" времени между днями (рейсы дня укладываются в 27 ч)
+
+class _RosterDriver:
+    """
+    Состояние водителя при построении расписания greedy_algorithm.
+    """
+    __slots__ = ('dt', 'did', 'bus', 'last_day', 'last_end', 'work', 'work_acc',
+                 'short_breaks', 'lunch', 'ready_at')
+
+    def __init__(self, dt, did):
+        self.dt = dt
+        self.did = did
+        self.bus = None
+        self.last_day = None
+
+    def start_day(self, day):
+        self.last_day = day
+        self.last_end = None
+        self.work = 0          # Суммарная работа за день
+        self.work_acc = 0      # B: работа с последнего перерыва
+        self.short_breaks = 0  # B: коротких перерывов подряд
+        self.lunch = False     # A: обед после 4 ч работы уже был
+
+    def fits(self, end, duration, last_start):
+        """
+        Рейс не приведёт к переработке (A - 9 ч, B - 12 ч), а водитель A,
+        перешагнув 4 ч без обеда, ещё успеет взять рейс после часового перерыва
+        (last_start - начало последнего рейса дня).
+        """
+        if self.dt == 'A':
+            if not self.lunch and self.work + duration > 240 and end + 60 > last_start:
+                return False
+            return self.work + duration <= 540
+        return self.work + duration <= 720
+
+    def take(self, start, end, duration):
+        """
+        Назначаем рейс и вычисляем, когда водитель снова готов к работе
+        без нарушения правил обеда (A) и перерывов (B).
+        """
+        if self.last_end is not None:
+            gap = start - self.last_end
+            if self.dt == 'A' and self.work >= 240 and gap >= 60:
+                self.lunch = True
+            if self.dt == 'B' and self.work_acc >= 120:
+                self.short_breaks = self.short_breaks + 1 if gap < 60 else 0
+                self.work_acc = 0
+        self.work += duration
+        self.last_end = end
+        rest = 0
+        if self.dt == 'A' and not self.lunch and self.work >= 240:
+            rest = 60
+        if self.dt == 'B':
+            self.work_acc += duration
+            if self.work_acc >= 120:
+                rest = 60 if self.short_breaks >= 2 else 15
+        self.ready_at = end + rest
+
+def greedy_algorithm(index=None, b_ratio=0.3):
+    """
+    Конструктивный жадный алгоритм, O(trips log trips).
+    Рейсы обходятся в хронологическом порядке, для каждого рейса:
+    - водитель: из готовых сегодня - тот, кто освободился раньше всех
+      (с учётом обеда A после 4 ч и перерывов B каждые 2 ч, без переработки);
+      если таких нет - свободный водитель из прошлых дней (B - не раньше чем
+      через двое суток отдыха), иначе нанимаем нового (доля B - b_ratio);
+    - автобус: последний автобус водителя, если после него никто на нём
+      не ездил и он свободен (без пересменки);
+      иначе освободившийся раньше всех (раскраска интервального графа),
+      если он простоял >=10 мин или номеров уже BASE_BUSES; иначе новый номер.
+    Даёт почти допустимое расписание - точку сравнения и затравку для ГА.
+    """
+    if index is None:
+        index = default_index()
+    ind = Chromosome.empty(len(index))
+    hired = {'A': 0, 'B': 0}
+    idle = {'A': deque(), 'B': deque()}  # Водители, ещё не работавшие в текущий день
+    ready = []       # Куча (ready_at, seq, driver) работающих в текущий день
+    buses = []       # Куча (освобождается_abs, b)
+    bus_free = {}    # b -> момент освобождения (абсолютное время)
+    bus_driver = {}  # b -> водитель последнего рейса автобуса
+    last_start = 0
+    day = None
+    seq = 0
+
+    for i in index.order:
+        start, end, duration = index.starts[i], index.ends[i], index.durations[i]
+        if index.days[i] != day:
+            # Новый день: сегодняшние водители уходят в резерв
+            day = index.days[i]
+            for _, _, drv in ready:
+                idle[drv.dt].append(drv)
+            ready = []
+            lo, hi = index.day_ranges[day]
+            last_start = index.starts[index.order[hi-1]]
+        start_abs = day*DAY_SPAN + start
+
+        # Водитель
+        drv = None
+        while ready and ready[0][0] <= start:
+            _, _, cand = heapq.heappop(ready)
+            if cand.fits(end, duration, last_start):
+                drv = cand
+                break
+            idle[cand.dt].append(cand)  # На сегодня отработал
+        if drv is None:
+            for dt in ('A', 'B'):
+                pool = idle[dt]
+                for _ in range(len(pool)):
+                    cand = pool.popleft()
+                    if cand.last_day != day and (dt == 'A' or cand.last_day is None
+                                                 or day - cand.last_day >= 3):
+                        cand.start_day(day)
+                        if not cand.fits(end, duration, last_start):
+                            pool.append(cand)
+                            continue
+                        drv = cand
+                        break
+                    pool.append(cand)
+                if drv is not None:
+                    break
+        if drv is None:
+            total = hired['A'] + hired['B']
+            dt = 'B' if hired['B'] < b_ratio*(total + 1) - 0.5 else 'A'
+            hired[dt] += 1
+            drv = _RosterDriver(dt, hired[dt])
+            drv.start_day(day)
+        drv.take(start, end, duration)
+        seq += 1
+        heapq.heappush(ready, (drv.ready_at, seq, drv))
+
+        # Автобус
+        b = drv.bus
+        if b is None or bus_driver[b] is not drv or bus_free[b] > start_abs:
+            b = None
+            while buses:
+                free_at, cand = buses[0]
+                if free_at != bus_free[cand]:
+                    heapq.heappop(buses)  # Устаревшая запись
+                    continue
+                if free_at <= start_abs - 10 or (free_at <= start_abs
+                                                 and len(bus_free) >= BASE_BUSES):
+                    heapq.heappop(buses)
+                    b = cand
+                break
+            if b is None:
+                b = len(bus_free) + 1
+        bus_free[b] = day*DAY_SPAN + end
+        bus_driver[b] = drv
+        heapq.heappush(buses, (bus_free[b], b))
+        drv.bus = b
+
+        ind.set_gene(i, drv.dt, drv.did, b)
+    return ind
+
+# ОПЕРАТИВНОЕ ПЕРЕПЛАНИРОВАНИЕ
+REPLAN_TIME_BUDGET = 2.0  # Бюджет времени replan по умолчанию, секунд
+REPLAN_PERTURB     = 3    # Сколько рейсов случайно меняется при встряске между локальными поисками
+REPLAN_STALL       = 50   # Встрясок подряд без улучшения, после которых replan завершается досрочно
+REPLAN_MAX_EVALS   = 20000  # Предел пробных ходов одного локального поиска в replan
+
+def _insert_trip(st, i, old_gene, drivers_off, forbidden, deadline=None):
+    """
+    Повторное назначение снятого рейса i. Водитель - прежний, если доступен,
+    иначе лучший из работающих в этот день и по одному новому каждого типа
+    (пробуется на прежнем или первом доступном автобусе); затем для выбранного
+    водителя перебираются автобусы из BASE_BUSES. Так рейс стоит
+    O(водителей дня + автобусов) пересчётов, а не их произведение.
+    Лучшее назначение принимается, только если фитнес выше, чем без рейса.
+    После deadline перебор прекращается (рейс может остаться неназначенным).
+    """
+    _, code, did, old_bus = old_gene
+    index = st.index
+    if (code, did) not in drivers_off:
+        drivers = [(code, did)]
+    else:
+        lo, hi = index.day_ranges[index.days[i]]
+        drivers = [key for key, ranks in st.drivers.items() if key not in drivers_off
+                   and bisect.bisect_left(ranks, lo) < bisect.bisect_left(ranks, hi)]
+        for c in DRIVER_TYPE_CODES.values():
+            used = {d for (c2, d) in st.drivers if c2 == c} | {d for (c2, d) in drivers_off if c2 == c}
+            fresh = next((d for d in range(1, MAX_DRIVER_ID + 1) if d not in used), None)
+            if fresh is not None:
+                drivers.append((c, fresh))
+    base_fit = st.fitness
 
-# НАИВНЫЙ АЛГОРИТМ
-def greedy_algorithm():
+    def expired():
+        return deadline is not None and time.perf_counter() >= deadline
+
+    def trial(gene):
+        undo = _set_genes(st, [gene])
+        fit = st.fitness
+        _set_genes(st, undo)
+        return fit
+
+    # 1) Выбор водителя: лучший, даже если рейс с ним пока не выгоден
+    buses = range(1, BASE_BUSES + 1)
+    best_fit, best_gene = None, None
+    for c, d in drivers:
+        if expired():
+            break
+        b = old_bus if old_bus in buses and not forbidden(c, d, old_bus) else next(
+            (b for b in buses if not forbidden(c, d, b)), None)
+        if b is not None:
+            fit = trial((i, c, d, b))
+            if best_fit is None or fit > best_fit:
+                best_fit, best_gene = fit, (i, c, d, b)
+    if best_gene is None:
+        return
+    # 2) Выбор автобуса для этого водителя
+    _, c, d, tried = best_gene
+    for b in buses:
+        if expired():
+            break
+        if b != tried and not forbidden(c, d, b):
+            fit = trial((i, c, d, b))
+            if fit > best_fit:
+                best_fit, best_gene = fit, (i, c, d, b)
+    if best_fit > base_fit:
+        _set_genes(st, [best_gene])
+
+def replan(ind, unavailable_buses=(), unavailable_drivers=(), days=None, window=None,
+           frozen_trips=(), time_budget=REPLAN_TIME_BUDGET, index=None, seed=None):
     """
-    Простейший наивный алгоритм:
-    Всем рейсам одинаково назначаем водителя A1 и автобус 1.
-    Штрафы при этом могут быть высокими,
-    но даёт точку сравнения с результатами ГА.
+    Оперативное перепланирование готового расписания ind при сбоях.
+      - unavailable_buses: номера недоступных автобусов;
+      - unavailable_drivers: недоступные водители (dt, did), например ('A', 5);
+      - days: перепланируемые дни (по умолчанию - дни, где есть рейсы
+        на недоступных автобусах или водителях);
+      - window: (начало, конец) в минутах от 00:00 - менять только рейсы,
+        начинающиеся в этом окне внутри days;
+      - frozen_trips: ID рейсов, которые менять нельзя (например, уже вышедших).
+    Недоступность действует в пределах перепланируемого среза, рейсы вне его
+    не меняются. Рейсы на недоступных ресурсах снимаются и назначаются заново
+    (_insert_trip), затем срез улучшается local_search с ограничением ходов,
+    а оставшийся до time_budget секунд бюджет уходит на встряски
+    (REPLAN_PERTURB случайных ходов) с повторным локальным поиском,
+    пока REPLAN_STALL встрясок подряд не дадут улучшения. Срок time_budget
+    проверяется перед каждым пробным ходом, каждый локальный поиск
+    ограничен REPLAN_MAX_EVALS ходами; в бюджет не входит только
+    начальная полная оценка ind.
+    Все пересчёты - инкрементальные через FitnessState, так что затрагиваются
+    только водители, автобусы и дни среза.
+    Возвращает (новая хромосома, фитнес, отчёт).
     """
-    greedy_ind = []
-    for trip in POSSIBLE_TRIPS:
-        trip_id = trip['id']
-        greedy_ind.append((trip_id, 'A', 1, 1))
-    return greedy_ind
+    started = time.perf_counter()
+    if index is None:
+        index = default_index()
+    rng = random.Random(seed)
+    buses_off = set(unavailable_buses)
+    drivers_off = {(DRIVER_TYPE_CODES[dt], did) for dt, did in unavailable_drivers}
+
+    def forbidden(code, did, b):
+        return b in buses_off or (code, did) in drivers_off
+
+    def hit(i):
+        return bool(ind.types[i] and ind.buses[i]
+                    and forbidden(ind.types[i], ind.ids[i], ind.buses[i]))
+
+    if days is None:
+        days = {index.days[i] for i in range(len(index)) if hit(i)}
+    frozen = set(frozen_trips)
+    trips = set()
+    for day in days:
+        lo, hi = index.day_ranges.get(day, (0, 0))
+        for i in index.order[lo:hi]:
+            if index.ids[i] in frozen:
+                continue
+            if window is None or window[0] <= index.starts[i] < window[1]:
+                trips.add(i)
+
+    state = fitness_state(ind.copy(), index)
+    fitness_before = state.fitness
+    # Бюджет отсчитывается после полной оценки: на больших таблицах она одна
+    # может занять больше time_budget, и на ремонт не осталось бы времени
+    deadline = time.perf_counter() + time_budget
+    stripped = [(i, ind.types[i], ind.ids[i], ind.buses[i]) for i in sorted(trips) if hit(i)]
+    if stripped:
+        _set_genes(state, [(i, 0, 0, 0) for i, _, _, _ in stripped])
+    for gene in stripped:
+        _insert_trip(state, gene[0], gene, drivers_off, forbidden, deadline)
+
+    best = local_search(state, max_evals=REPLAN_MAX_EVALS, trips=trips, forbidden=forbidden,
+                        deadline=deadline) if trips else state
+    mutable = sorted(trips)
+    restarts = stall = 0
+    while mutable and stall < REPLAN_STALL and time.perf_counter() < deadline:
+        restarts += 1
+        stall += 1
+        st = best.copy(best.ind.copy())
+        for i in rng.sample(mutable, min(REPLAN_PERTURB, len(mutable))):
+            if st.ind.types[i] and st.ind.buses[i]:
+                moves = candidate_moves(st, i, trips, forbidden)
+                _set_genes(st, rng.choice(moves))
+        st = local_search(st, max_evals=REPLAN_MAX_EVALS, trips=trips, forbidden=forbidden,
+                          deadline=deadline)
+        if st.fitness > best.fitness:
+            best, stall = st, 0
+
+    result = best.ind
+    report = {
+        'days':           sorted(days),
+        'trips':          len(trips),
+        'stripped':       len(stripped),
+        'unassigned':     sum(1 for i, _, _, _ in stripped
+                              if not (result.types[i] and result.buses[i])),
+        'changed':        len(changed_genes(ind, result)),
+        'fitness_before': fitness_before,
+        'restarts':       restarts,
+        'elapsed':        time.perf_counter() - started,
+    }
+    return result, best.fitness, report
 
 # ФУНКЦИЯ ДЛЯ ОТОБРАЖЕНИЯ РАСПИСАНИЯ
-def display_schedule(ind):
+def display_schedule(ind, index=None):
     """
     Выводим в консоль расписание по дням:
     Для каждого дня печатаем рейсы (номер, время, водитель, автобус).
     """
+    if index is None:
+        index = default_index()
     schedule = decode_individual(ind)
-    trips_by_day = {}
-    for (tr, dt, did, b) in schedule:
-        if dt is not None and did is not None and b is not None:
-            day = tr['day']
-            if day not in trips_by_day:
-                trips_by_day[day] = []
-            trips_by_day[day].append((tr, dt, did, b))
-
-    sorted_days = sorted(trips_by_day.keys())
+    multi_route = len(set(index.routes)) > 1
     print("Расписание (выполненные рейсы):")
-    for day in sorted_days:
-        day_name = DAY_NAMES[day]
+    for day in sorted(index.day_ranges):
+        lo, hi = index.day_ranges[day]
+        day_trips = [schedule[i] for i in index.order[lo:hi]
+                     if schedule[i][1] is not None and schedule[i][3] is not None]
+        if not day_trips:
+            continue
+        day_name = DAY_NAMES[day % len(DAY_NAMES)]
         print(f"{day_name}:")
-        day_trips = sorted(trips_by_day[day], key=lambda x: x[0]['start_min'])
-        for (tr, dt, did, b) in day_trips:
+        for (i, dt, did, b) in day_trips:
             day_number = day + 1
-            print(f"  День {day_number}, Рейс {tr['id']}: "
-                  f"{format_time(tr['start_min'])}-{format_time(tr['end_min'])}, "
-                  f"Продолжительность: {tr['duration']} мин, Водитель: {dt}{did}, Автобус: {b}")
+            route = f"Маршрут {index.routes[i]} (депо {index.depots[i]}), " if multi_route else ""
+            print(f"  День {day_number}, {route}Рейс {index.ids[i]}: "
+                  f"{format_time(index.starts[i])}-{format_time(index.ends[i])}, "
+                  f"Продолжительность: {index.durations[i]} мин, Водитель: {dt}{did}, Автобус: {b}")
         print()
 
+# ЭКСПОРТ И ЗАГРУЗКА РАСПИСАНИЯ
+EXPORT_FIELDS = ('trip', 'day', 'route', 'depot', 'start', 'end', 'start_min', 'end_min',
+                 'duration', 'driver', 'bus', 'driver_penalty', 'shift_penalty', 'extra_bus')
+SCHEDULE_MAGIC   = b'BUSSCHED'
+SCHEDULE_VERSION = 1
+# Столбцы двоичного формата: (имя, typecode array)
+SCHEDULE_COLUMNS = (('ids', 'i'), ('routes', 'i'), ('depots', 'i'), ('days', 'i'),
+                    ('starts', 'i'), ('ends', 'i'), ('durations', 'i'),
+                    ('types', 'h'), ('driver_ids', 'h'), ('buses', 'h'),
+                    ('driver_penalty', 'i'), ('shift_penalty', 'h'))
+EXPORT_CHUNK = 1 << 16  # Элементов столбца за одну запись
+
+def trip_penalties(ind, index=None):
+    """
+    Штрафы по рейсам для аннотаций экспорта: (FitnessState,
+    суммарный штраф водителя рейса, штраф пересменки перед рейсом на его автобусе).
+    """
+    if index is None:
+        index = default_index()
+    st = fitness_state(ind, index)
+    n = len(index)
+    driver_pen = [0]*n
+    shift_pen = [0]*n
+    for key, ranks in st.drivers.items():
+        pen = st.driver_pen.get(key, 0)
+        if pen:
+            for r in ranks:
+                driver_pen[index.order[r]] = pen
+    for ranks in st.buses.values():
+        for ra, rb in zip(ranks, ranks[1:]):
+            shift_pen[index.order[rb]] = st.shift_pair(ra, rb)
+    return st, driver_pen, shift_pen
+
+def schedule_rows(ind, index=None):
+    """
+    Выполняемые рейсы расписания в хронологическом порядке - по словарю
+    с полями EXPORT_FIELDS на рейс (генератор, строки не копятся в памяти).
+    Неполные гены (водитель без автобуса или автобус без водителя)
+    не выполняются и в строки не попадают.
+    """
+    if index is None:
+        index = default_index()
+    _, driver_pen, shift_pen = trip_penalties(ind, index)
+    for i in index.order:
+        code, b = ind.types[i], ind.buses[i]
+        if not (code and b):
+            continue
+        yield {
+            'trip': index.ids[i], 'day': index.days[i],
+            'route': index.routes[i], 'depot': index.depots[i],
+            'start': format_time(index.starts[i]), 'end': format_time(index.ends[i]),
+            'start_min': index.starts[i], 'end_min': index.ends[i],
+            'duration': index.durations[i],
+            'driver': f"{DRIVER_TYPES[code]}{ind.ids[i]}", 'bus': b,
+            'driver_penalty': driver_pen[i], 'shift_penalty': shift_pen[i],
+            'extra_bus': int(b > BASE_BUSES),
+        }
+
+@contextmanager
+def _open_output(dest, mode):
+    # dest - путь или уже открытый файл (тогда он не закрывается)
+    if hasattr(dest, 'write'):
+        yield dest
+    else:
+        with open(dest, mode, **({} if 'b' in mode else {'newline': '', 'encoding': 'utf-8'})) as f:
+            yield f
+
+def export_csv(ind, dest, index=None):
+    """
+    Потоковая запись расписания в CSV (строка на выполняемый рейс, см. schedule_rows;
+    неполные гены не сохраняются). dest - путь или открытый текстовый файл.
+    Возвращает число записанных рейсов.
+    """
+    count = 0
+    with _open_output(dest, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in schedule_rows(ind, index):
+            writer.writerow(row)
+            count += 1
+    return count
+
+def export_jsonl(ind, dest, index=None):
+    """
+    Потоковая запись расписания в JSON Lines (объект на выполняемый рейс;
+    неполные гены не сохраняются). dest - путь или открытый текстовый файл.
+    Возвращает число записанных рейсов.
+    """
+    count = 0
+    with _open_output(dest, 'w') as f:
+        for row in schedule_rows(ind, index):
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+def export_binary(ind, dest, index=None):
+    """
+    Компактный столбцовый двоичный формат: заголовок (SCHEDULE_MAGIC, версия,
+    число рейсов, фитнес), затем столбцы SCHEDULE_COLUMNS - таблица рейсов,
+    хромосома и штрафы по рейсам - для всех рейсов, включая невыполняемые.
+    Каждый столбец: имя, typecode, длина в байтах и сами данные, которые пишутся
+    частями по EXPORT_CHUNK элементов. dest - путь или открытый двоичный файл.
+    """
+    if index is None:
+        index = default_index()
+    st, driver_pen, shift_pen = trip_penalties(ind, index)
+    table = index.table
+    sources = {name: getattr(table, name) for name in TripTable.COLUMNS}
+    sources.update(types=ind.types, driver_ids=ind.ids, buses=ind.buses,
+                   driver_penalty=driver_pen, shift_penalty=shift_pen)
+    n = len(index)
+    with _open_output(dest, 'wb') as f:
+        f.write(struct.pack('<8sHId', SCHEDULE_MAGIC, SCHEDULE_VERSION, n, st.fitness))
+        for name, typecode in SCHEDULE_COLUMNS:
+            name_bytes = name.encode('ascii')
+            f.write(struct.pack('<B', len(name_bytes)) + name_bytes + typecode.encode('ascii'))
+            f.write(struct.pack('<Q', n*array(typecode).itemsize))
+            column = sources[name]
+            for k in range(0, n, EXPORT_CHUNK):
+                f.write(array(typecode, column[k:k + EXPORT_CHUNK]).tobytes())
+    return n
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Файл расписания обрезан")
+    return data
+
+def load_binary_schedule(path):
+    """
+    Чтение файла export_binary.
+    Возвращает (хромосома, TripIndex из сохранённой таблицы, сохранённый фитнес, столбцы).
+    """
+    with open(path, 'rb') as f:
+        magic, version, n, fit = struct.unpack('<8sHId', _read_exact(f, struct.calcsize('<8sHId')))
+        if magic != SCHEDULE_MAGIC:
+            raise ValueError("Не файл расписания export_binary")
+        if version != SCHEDULE_VERSION:
+            raise ValueError(f"Неподдерживаемая версия файла расписания: {version}")
+        columns = {}
+        while True:
+            size_byte = f.read(1)
+            if not size_byte:
+                break
+            name = _read_exact(f, size_byte[0]).decode('ascii')
+            typecode = _read_exact(f, 1).decode('ascii')
+            (nbytes,) = struct.unpack('<Q', _read_exact(f, 8))
+            column = array(typecode)
+            column.frombytes(_read_exact(f, nbytes))
+            columns[name] = column
+    table = TripTable()
+    for name in TripTable.COLUMNS:
+        setattr(table, name, columns[name])
+    ind = Chromosome(columns['types'], columns['driver_ids'], columns['buses'])
+    if len(ind) != n:
+        raise ValueError("Число рейсов в столбцах не совпадает с заголовком")
+    return ind, TripIndex(table), fit, columns
+
+def load_schedule(path, index=None):
+    """
+    Загрузка расписания, сохранённого export_csv, export_jsonl или export_binary
+    (формат определяется по содержимому), для повторной оценки
+    (fitness(ind, index)) или тёплого старта ГА
+    (iter_genetic_algorithm(population=seed_population(POP_SIZE, index, base=ind)))
+    и replan.
+    Двоичный файл содержит таблицу рейсов; если index передан, она должна с ним
+    совпадать. Текстовые форматы сопоставляются с index по ID рейсов
+    (по умолчанию default_index()).
+    Точно хромосома восстанавливается только из export_binary. Текстовые
+    форматы хранят лишь выполняемые рейсы: неполные гены (водитель без
+    автобуса или автобус без водителя) загружаются пустыми, поэтому фитнес
+    совпадает, а мутации при тёплом старте идут уже от другой хромосомы.
+    Возвращает (хромосома, TripIndex).
+    """
+    with open(path, 'rb') as f:
+        head = f.read(len(SCHEDULE_MAGIC))
+    if head == SCHEDULE_MAGIC:
+        ind, saved_index, _, _ = load_binary_schedule(path)
+        if index is None:
+            return ind, saved_index
+        if saved_index.ids != index.ids or saved_index.starts != index.starts:
+            raise ValueError("Расписание сохранено для другого набора рейсов")
+        return ind, index
+
+    if index is None:
+        index = default_index()
+    with open(path, newline='', encoding='utf-8') as f:
+        if head.lstrip().startswith(b'{'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        genes = [(int(row['trip']), row['driver'][0], int(row['driver'][1:]), int(row['bus']))
+                 for row in rows]
+    try:
+        return Chromosome.from_genes(genes, index), index
+    except KeyError as e:
+        raise ValueError(f"Рейс {e.args[0]} отсутствует в наборе рейсов") from None
+
 # ЗАПУСК ПРОГРАММЫ
 if __name__ == "__main__":
     # Запускаем ГА
@@ -505,9 +2660,9 @@ if __name__ == "__main__":
     # Сравниваем с жадным алгоритмом
     greedy_sol = greedy_algorithm()
     greedy_fit = fitness(greedy_sol)
-    print("\nСравнение с наивным алгоритмом:")
-    print(f"Фитнес наивного алгоритма: {greedy_fit:.4f}")
+    print("\nСравнение с жадным алгоритмом:")
+    print(f"Фитнес жадного алгоритма: {greedy_fit:.4f}")
     if greedy_fit > best_fitness:
-        print("Наивный алгоритм показал более высокий фитнес.")
+        print("Жадный алгоритм показал более высокий фитнес.")
     else:
         print("Генетический алгоритм показал более высокий фитнес.")
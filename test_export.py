@@ -0,0 +1,64 @@
+"""
+Экспорт и загрузка расписания: CSV, JSON Lines и двоичный формат.
+Запуск: python -m pytest -q
+"""
+import random
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def index():
+    return main.TripIndex(main.generate_trip_table(
+        [{'id': r, 'depot': r, 'duration': (40, 80), 'headway': 30, 'peak_headway': 15}
+         for r in (1, 2)], days=3, seed=2))
+
+
+def partial_individual(index, rng):
+    """
+    Полные гены вперемешку с неполными: водитель без автобуса, автобус без водителя.
+    """
+    ind = main.Chromosome.empty(len(index))
+    for i in range(len(index)):
+        r = rng.random()
+        if r < 0.2:
+            ind.set_gene(i, rng.choice('AB'), rng.randint(1, 30), None)
+        elif r < 0.4:
+            ind.set_gene(i, None, None, rng.randint(1, 12))
+        elif r < 0.9:
+            ind.set_gene(i, rng.choice('AB'), rng.randint(1, 30), rng.randint(1, 12))
+    return ind
+
+
+def executed_only(ind):
+    copy = ind.copy()
+    for i in range(len(ind)):
+        if not (ind.types[i] and ind.buses[i]):
+            copy.set_gene(i, None, None, None)
+    return copy
+
+
+def test_binary_round_trip_is_exact(index, tmp_path):
+    ind = partial_individual(index, random.Random(0))
+    path = tmp_path / 'schedule.bin'
+    assert main.export_binary(ind, path, index) == len(index)
+    loaded, loaded_index, fit, _ = main.load_binary_schedule(path)
+    assert loaded.key() == ind.key()
+    assert loaded_index.ids == index.ids and loaded_index.starts == index.starts
+    assert fit == main.fitness(ind, index)
+    assert main.load_schedule(path, index)[0].key() == ind.key()
+
+
+@pytest.mark.parametrize('export', [main.export_csv, main.export_jsonl])
+def test_text_round_trip_keeps_executed_trips(index, tmp_path, export):
+    ind = partial_individual(index, random.Random(1))
+    path = tmp_path / 'schedule.txt'
+    count = export(ind, path, index)
+    expected = executed_only(ind)
+    assert count == sum(1 for i in range(len(ind)) if expected.types[i])
+    loaded, _ = main.load_schedule(path, index)
+    # Неполные гены теряются, выполняемые рейсы и фитнес - нет
+    assert loaded.key() == expected.key()
+    assert main.fitness(loaded, index) == main.fitness(ind, index)
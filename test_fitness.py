@@ -0,0 +1,121 @@
+"""
+Эквивалентность путей оценки фитнеса: скалярный fitness, пакетный fitness_batch,
+полный fitness_state и инкрементальный fitness_delta.
+Запуск: python -m pytest -q
+"""
+import random
+
+import pytest
+
+import main
+
+
+def random_individuals(index, rng, count):
+    """
+    Индивидуумы трёх видов: случайные (как init_individual), плотные
+    (все рейсы назначены на несколько водителей - много штрафов) и с неполными
+    генами (водитель без автобуса или автобус без водителя).
+    """
+    n = len(index)
+    population = []
+    for _ in range(count):
+        ind = main.Chromosome.empty(n)
+        for i in range(n):
+            ind.set_gene(i, rng.choice('AB'), rng.randint(1, 30), rng.randint(1, 12))
+            if rng.random() < 0.2:
+                ind.set_gene(i, None, None, None)
+        population.append(ind)
+    for _ in range(count):
+        ind = main.Chromosome.empty(n)
+        for i in range(n):
+            ind.set_gene(i, rng.choice('AB'), rng.randint(1, 3), rng.randint(1, 12))
+        population.append(ind)
+    for _ in range(count):
+        ind = main.Chromosome.empty(n)
+        for i in range(n):
+            r = rng.random()
+            if r < 0.3:
+                ind.set_gene(i, rng.choice('AB'), rng.randint(1, 30), None)
+            elif r < 0.6:
+                ind.set_gene(i, None, None, rng.randint(1, 12))
+            else:
+                ind.set_gene(i, rng.choice('AB'), rng.randint(1, 30), rng.randint(1, 12))
+        population.append(ind)
+    return population
+
+
+PROBLEMS = {
+    'single_route': lambda: main.Scheduler(seed=1).index,
+    'multi_route': lambda: main.TripIndex(main.generate_trip_table(
+        [{'id': r, 'depot': r % 2 + 1, 'duration': (40, 80), 'headway': 30, 'peak_headway': 15}
+         for r in range(1, 4)], days=3, seed=2)),
+}
+
+
+@pytest.fixture(params=sorted(PROBLEMS))
+def index(request):
+    return PROBLEMS[request.param]()
+
+
+def test_batch_matches_scalar(index):
+    population = random_individuals(index, random.Random(0), 20)
+    population.append(main.greedy_algorithm(index))
+    assert main.fitness_batch(population, index) == [main.fitness(ind, index) for ind in population]
+
+
+def test_batch_shared_parts_match_scalar(index):
+    # Мутанты одного родителя делят с ним большинство дней и водителей -
+    # штрафы берутся из общих таблиц BatchScorer
+    rng = random.Random(4)
+    parent = random_individuals(index, rng, 1)[0]
+    population = [parent]
+    for _ in range(20):
+        mutant = parent.copy()
+        for i in rng.sample(range(len(index)), 3):
+            mutant.set_gene(i, rng.choice('AB'), rng.randint(1, 30), rng.choice([None, 1, 9]))
+        population.append(mutant)
+    assert main.fitness_batch(population, index) == [main.fitness(ind, index) for ind in population]
+
+
+def test_state_matches_scalar(index):
+    for ind in random_individuals(index, random.Random(1), 10):
+        assert main.fitness_state(ind, index).fitness == main.fitness(ind, index)
+
+
+def test_delta_matches_scalar(index):
+    rng = random.Random(2)
+    population = random_individuals(index, rng, 10)
+    for parent, child in zip(population, population[1:]):
+        state = main.fitness_state(parent, index)
+        # Потомок, отличающийся от родителя в нескольких генах
+        mutant = parent.copy()
+        changed = rng.sample(range(len(index)), 5)
+        for i in changed:
+            mutant.set_gene(i, rng.choice('AB'), rng.randint(1, 30), rng.choice([None, 1, 9]))
+        assert main.fitness_delta(state, changed, mutant).fitness == main.fitness(mutant, index)
+        # Потомок, не имеющий с родителем ничего общего
+        assert (main.fitness_delta(state, main.changed_genes(parent, child), child).fitness
+                == main.fitness(child, index))
+        # Состояние родителя не меняется
+        assert state.fitness == main.fitness(parent, index)
+
+
+def test_driver_breakdown_sums_to_check(index):
+    for ind in random_individuals(index, random.Random(3), 5):
+        schedule = main.decode_individual(ind)
+        assert (sum(main.driver_penalty_breakdown(schedule, index).values())
+                == main.check_driver_constraints(schedule, index))
+
+
+def test_bus_double_bookings_report_every_pair():
+    # Рейсы 2 и 3 вложены в рейс 1 и пересекаются между собой
+    index = main.TripIndex(main.TripTable.from_trips([
+        {'id': 1, 'day': 0, 'start_min': 400, 'end_min': 500, 'duration': 100},
+        {'id': 2, 'day': 0, 'start_min': 410, 'end_min': 420, 'duration': 10},
+        {'id': 3, 'day': 0, 'start_min': 415, 'end_min': 430, 'duration': 15},
+        {'id': 4, 'day': 0, 'start_min': 500, 'end_min': 510, 'duration': 10},
+    ]))
+    schedule = [(i, 'A', i + 1, 1) for i in range(len(index))]
+    assert main.find_bus_double_bookings(schedule, index) == [(0, 1, 1, 2), (0, 1, 1, 3), (0, 1, 2, 3)]
+    assert (main.check_bus_constraints(schedule, bus_aware=True, index=index)
+            - main.check_bus_constraints(schedule, index=index)) == 3*main.PENALTY_BUS_CONFLICT
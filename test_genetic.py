@@ -0,0 +1,60 @@
+"""
+Основной цикл ГА: размер популяции, контрольные точки, модель островов.
+Запуск: python -m pytest -q
+"""
+import random
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def index():
+    return main.Scheduler(days=3, seed=1).index
+
+
+@pytest.mark.parametrize('size, scheme', [(20, 'tournament'), (4, 'sus'), (3, 'rank')])
+def test_population_size_follows_given_population(index, size, scheme):
+    random.seed(0)
+    population = [main.init_individual(index) for _ in range(size)]
+    sizes = [len(stats['population'])
+             for stats in main.iter_genetic_algorithm(index=index, population=population,
+                                                      generations=3, selection_scheme=scheme)]
+    assert sizes == [size]*3
+
+
+
+def run(index, **options):
+    """
+    История (лучший фитнес, лучшая особь) по поколениям и итоговая популяция.
+    """
+    history = []
+    for stats in main.iter_genetic_algorithm(index=index, **options):
+        history.append((stats['best'], stats['best_individual'].key()))
+    return history, [ind.key() for ind in stats['population']]
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_resume_reproduces_uninterrupted_run(index, tmp_path, incremental):
+    path = str(tmp_path / 'ga.ckpt')
+    random.seed(0)
+    full, final = run(index, generations=6, incremental=incremental)
+
+    random.seed(0)
+    run(index, generations=3, incremental=incremental, checkpoint_path=path)
+    random.seed(12345)  # Состояние random восстанавливается из контрольной точки
+    resumed, resumed_final = run(index, generations=6, incremental=incremental, resume_from=path)
+    assert resumed == full[3:]
+    assert resumed_final == final
+
+
+@pytest.mark.parametrize('topology', main.MIGRATION_TOPOLOGIES)
+def test_islands_independent_of_process_count(index, topology):
+    results = []
+    for processes in (1, 3):
+        best, fit, stats = main.island_genetic_algorithm(
+            islands=3, migration_interval=2, migrants=2, topology=topology,
+            processes=processes, index=index, seed=7, generations=5)
+        results.append((best.key(), fit, stats))
+    assert results[0] == results[1]
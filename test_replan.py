@@ -0,0 +1,86 @@
+"""
+Оперативное перепланирование replan: бюджет времени и запреты на ресурсы.
+Запуск: python -m pytest -q
+"""
+import random
+import time
+
+import pytest
+
+import main
+
+
+def day_driver_schedule(index):
+    """
+    Жадное расписание, в котором водители работают по одному дню
+    (ID сдвигается на номер дня) - штрафы водителей не копятся по горизонту.
+    """
+    random.seed(0)
+    ind = main.greedy_algorithm(index)
+    for i in range(len(index)):
+        if ind.types[i]:
+            ind.ids[i] += 10*index.days[i]
+    return ind
+
+
+def test_replan_budget_excludes_state_build():
+    # Большая таблица: полная оценка дольше time_budget
+    index = main.Scheduler(days=1500, seed=0).index
+    ind = day_driver_schedule(index)
+    t0 = time.perf_counter()
+    state = main.fitness_state(ind, index)
+    build = time.perf_counter() - t0
+
+    # На запасной автобус пересаживаются рейсы, снятие которых ухудшает фитнес
+    spare = main.BASE_BUSES
+    rng = random.Random(0)
+    disrupted = ind.copy()
+    moved = []
+    for i in rng.sample(range(len(index)), len(index)):
+        if not ind.types[i]:
+            continue
+        stripped = ind.copy()
+        stripped.set_gene(i, None, None, None)
+        if main.fitness_delta(state, [i], stripped).fitness < state.fitness:
+            disrupted.buses[i] = spare
+            moved.append(i)
+        if len(moved) == 20:
+            break
+
+    time_budget = 0.1
+    result, fit, report = main.replan(disrupted, unavailable_buses=[spare],
+                                      time_budget=time_budget, index=index, seed=0)
+    assert report['stripped'] == len(moved)
+    assert report['unassigned'] == 0
+    assert spare not in {result.buses[i] for i in moved}
+    assert fit >= state.fitness
+    assert report['elapsed'] < 2*build + time_budget + 1.0
+
+
+@pytest.mark.parametrize('disruption', [
+    {'unavailable_buses': [1]},
+    {'unavailable_drivers': [('A', 1), ('A', 2)]},
+    {'unavailable_buses': [2], 'unavailable_drivers': [('A', 1)], 'days': [2, 3],
+     'window': (600, 1200)},
+])
+def test_replan_respects_slice_and_forbidden_resources(disruption):
+    index = main.Scheduler(days=7, seed=0).index
+    random.seed(0)
+    ind = main.greedy_algorithm(index)
+    frozen = {index.ids[i] for i in range(0, len(index), 7)}
+    result, fit, report = main.replan(ind, time_budget=0.2, index=index, seed=0,
+                                      frozen_trips=frozen, **disruption)
+    assert report['stripped'] > 0
+    assert fit == main.fitness(result, index)
+    buses_off = set(disruption.get('unavailable_buses', ()))
+    drivers_off = {(main.DRIVER_TYPE_CODES[dt], did)
+                   for dt, did in disruption.get('unavailable_drivers', ())}
+    window = disruption.get('window')
+    for i in range(len(index)):
+        in_slice = (index.days[i] in report['days'] and index.ids[i] not in frozen
+                    and (window is None or window[0] <= index.starts[i] < window[1]))
+        if not in_slice:
+            assert result.gene(i) == ind.gene(i)
+        elif result.types[i] and result.buses[i]:
+            assert result.buses[i] not in buses_off
+            assert (result.types[i], result.ids[i]) not in drivers_off